@@ -6,10 +6,31 @@
 """
 
 import os
-import json
 import datetime
 from pathlib import Path
 
+from Conversation_Log import MarkdownLogWriter
+from Conversation_Store import open_store
+from Conversation_Summarizer import Summarizer
+
+# 本脚本使用的关键词表
+SUMMARY_RULES = {
+    "key_point_words": ['关键', '要点', '重要', '主要', '核心'],
+    "follow_up_words": ['需要', '应该', '建议', '可以', '下一步'],
+    "tags": [
+        {"tag": "数据分析", "question": ['数据', '分析']},
+        {"tag": "系统建立", "question": ['系统', '创建']},
+        {"tag": "对话管理", "question": ['对话', '记录']},
+        {"tag": "编程", "question": ['Python', '脚本']},
+        {"tag": "自动化", "question": ['自动化']},
+    ],
+}
+
+summarizer = Summarizer(SUMMARY_RULES)
+
+# 与 SmartConversationManager 共用的数据目录
+BASE_PATH = Path("C:/Users/wyx33/Desktop")
+
 def auto_save_conversation():
     """自动保存对话"""
     print("🤖 自动对话保存器启动...")
@@ -18,10 +39,11 @@ def auto_save_conversation():
     question = input("请输入您的问题: ")
     answer = input("请输入AI的回答: ")
     
-    # 自动总结
-    key_points = extract_key_points(answer)
-    tags = generate_tags(question, answer)
-    follow_up = identify_follow_up(answer)
+    # 自动总结（一次分句、一次匹配）
+    summary = summarizer.summarize(question, answer)
+    key_points = summary["key_points"]
+    tags = summary["tags"]
+    follow_up = summary["follow_up"]
     
     # 保存到文件
     save_to_files(question, answer, key_points, tags, follow_up)
@@ -31,81 +53,37 @@ def auto_save_conversation():
 
 def extract_key_points(answer):
     """提取关键要点"""
-    sentences = answer.split('。')
-    key_phrases = []
-    
-    for sentence in sentences:
-        if any(word in sentence for word in ['关键', '要点', '重要', '主要', '核心']):
-            key_phrases.append(sentence.strip())
-    
-    if not key_phrases:
-        key_phrases = [s.strip() for s in sentences[:3] if s.strip()]
-    
-    return key_phrases[:5]
+    return summarizer.summarize("", answer)["key_points"]
 
 def generate_tags(question, answer):
     """生成标签"""
-    tags = []
-    
-    if '数据' in question or '分析' in question:
-        tags.append('数据分析')
-    if '系统' in question or '创建' in question:
-        tags.append('系统建立')
-    if '对话' in question or '记录' in question:
-        tags.append('对话管理')
-    if 'Python' in question or '脚本' in question:
-        tags.append('编程')
-    if '自动化' in question:
-        tags.append('自动化')
-    
-    return list(set(tags))
+    return summarizer.summarize(question, answer)["tags"]
 
 def identify_follow_up(answer):
     """识别后续行动"""
-    follow_up = []
-    sentences = answer.split('。')
-    
-    for sentence in sentences:
-        if any(word in sentence for word in ['需要', '应该', '建议', '可以', '下一步']):
-            follow_up.append(sentence.strip())
-    
-    return follow_up[:3]
+    return summarizer.summarize("", answer)["follow_up"]
 
-def save_to_files(question, answer, key_points, tags, follow_up):
+def save_to_files(question, answer, key_points, tags, follow_up, storage=None):
     """保存到文件"""
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
     
-    # 保存到JSON
-    data_file = Path("C:/Users/wyx33/Desktop/conversation_data.json")
-    conversations = []
-    
-    if data_file.exists():
-        with open(data_file, 'r', encoding='utf-8') as f:
-            conversations = json.load(f)
-    
+    # 保存到对话存储：与 SmartConversationManager 共用同一个后端、同一把锁和同一个 id 序列
     conversation = {
         "timestamp": timestamp,
         "question": question,
         "answer": answer,
         "key_points": key_points,
         "tags": tags,
-        "follow_up": follow_up,
-        "id": len(conversations) + 1
+        "follow_up": follow_up
     }
     
-    conversations.append(conversation)
-    
-    with open(data_file, 'w', encoding='utf-8') as f:
-        json.dump(conversations, f, ensure_ascii=False, indent=2)
+    store = open_store(BASE_PATH, storage)
+    store.append(conversation)
+    if hasattr(store, "close"):
+        store.close()
     
     # 更新Markdown
-    log_file = Path("C:/Users/wyx33/Desktop/AI_Conversation_Log.md")
-    
-    if not log_file.exists():
-        create_initial_log(log_file)
-    
-    with open(log_file, 'r', encoding='utf-8') as f:
-        content = f.read()
+    log_file = BASE_PATH / "AI_Conversation_Log.md"
     
     new_entry = f"""
 ### {timestamp} - {tags[0] if tags else '新对话'}
@@ -124,13 +102,8 @@ def save_to_files(question, answer, key_points, tags, follow_up):
 ---
 """
     
-    if "## 对话记录" in content:
-        content = content.replace("## 📝 对话记录", f"## 对话记录{new_entry}")
-    else:
-        content += new_entry
-    
-    with open(log_file, 'w', encoding='utf-8') as f:
-        f.write(content)
+    # 增量写入：只改写页脚和统计字段
+    MarkdownLogWriter(log_file, lambda: create_initial_log(log_file)).append(new_entry)
 
 def create_initial_log(log_file):
     """创建初始日志"""
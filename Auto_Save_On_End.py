@@ -7,37 +7,148 @@
 
 import os
 import json
+import queue
 import datetime
+import threading
 import time
 from pathlib import Path
 
+from Conversation_Log import MarkdownLogWriter
+from Conversation_Store import open_store
+
+# 会话预写日志的刷新策略：攒够这么多行或距上次刷新超过这么多秒就写入并 fsync
+JOURNAL_FLUSH_LINES = 20
+JOURNAL_FLUSH_INTERVAL = 1.0
+
+class BackgroundSessionWriter(threading.Thread):
+    """
+    后台会话写入线程
+    
+    输入循环只把每行放进队列，不做任何磁盘操作；本线程按行数和时间策略
+    把新行追加到预写日志（JSON Lines）并 fsync，程序崩溃时最多丢失最后几秒的输入。
+    会话结束后由本线程完成最终保存并删除预写日志，结束时无需等待写入。
+    非守护线程：主程序退出前会等待最终保存完成。
+    """
+    
+    def __init__(self, journal_file, on_finish, flush_lines=JOURNAL_FLUSH_LINES,
+                 flush_interval=JOURNAL_FLUSH_INTERVAL):
+        super().__init__(name="conversation-writer")
+        self.journal_file = Path(journal_file)
+        self.on_finish = on_finish
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+    
+    def add(self, line):
+        """记录一行输入（立即返回）"""
+        self.queue.put(line)
+    
+    def finish(self):
+        """结束会话：刷新剩余内容后在后台保存（立即返回）"""
+        self.queue.put(None)
+    
+    def run(self):
+        pending = []
+        last_flush = time.monotonic()
+        with open(self.journal_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"start": datetime.datetime.now().strftime("%Y-%m-%d %H:%M")}) + "\n")
+            self._sync(f)
+            finished = False
+            while not finished:
+                timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush)) if pending else None
+                try:
+                    line = self.queue.get(timeout=timeout)
+                    if line is None:
+                        finished = True
+                    else:
+                        pending.append(line)
+                except queue.Empty:
+                    pass
+                
+                if pending and (finished or len(pending) >= self.flush_lines
+                                or time.monotonic() - last_flush >= self.flush_interval):
+                    f.write("".join(json.dumps({"line": text}, ensure_ascii=False) + "\n" for text in pending))
+                    self._sync(f)
+                    pending = []
+                    last_flush = time.monotonic()
+        
+        self.on_finish()
+        self.journal_file.unlink(missing_ok=True)
+    
+    @staticmethod
+    def _sync(f):
+        f.flush()
+        os.fsync(f.fileno())
+
 class AutoConversationSaver:
-    def __init__(self):
-        self.base_path = Path("C:/Users/wyx33/Desktop")
+    def __init__(self, base_path="C:/Users/wyx33/Desktop", storage=None):
+        self.base_path = Path(base_path)
         self.log_file = self.base_path / "AI_Conversation_Log.md"
-        self.data_file = self.base_path / "conversation_data.json"
+        # 当前会话的预写日志，程序中断后下次启动时据此恢复
+        self.journal_file = self.base_path / "conversation_session.journal"
         self.conversation_buffer = []
+        self.log_writer = MarkdownLogWriter(self.log_file, self.create_initial_log)
+        # 与 SmartConversationManager 共用同一个存储后端、同一把锁和同一个 id 序列
+        self.store = open_store(self.base_path, storage)
+        
+    def recover_session(self):
+        """恢复上次中断的会话：把预写日志中的内容补存后删除日志"""
+        if not self.journal_file.exists():
+            return False
         
+        timestamp = None
+        lines = []
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for record in f:
+                try:
+                    record = json.loads(record)
+                except ValueError:
+                    break  # 中断时未写完的最后一行
+                if "start" in record:
+                    timestamp = timestamp or record["start"]
+                else:
+                    lines.append(record["line"])
+        
+        if lines:
+            print(f"♻️ 发现上次中断的对话（{len(lines)} 行），正在恢复保存...")
+            full_conversation = "\n".join(lines)
+            timestamp = timestamp or datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+            self.update_markdown_log(full_conversation, timestamp)
+            self.save_to_json(full_conversation, timestamp)
+            print("✅ 已恢复上次中断的对话！")
+        self.journal_file.unlink()
+        return bool(lines)
+    
+
     def start_monitoring(self):
         """开始监控对话"""
+        self.recover_session()
+        
         print("🤖 智能对话监控器已启动...")
         print("📝 请开始对话，当您说'结束对话'时，系统会自动保存")
         print("�� 提示：您也可以按 Ctrl+C 手动结束监控")
         
+        # 输入在后台持续写入预写日志，结束时最终保存也在后台完成
+        writer = BackgroundSessionWriter(self.journal_file, self.auto_save_conversation)
+        writer.start()
+        
         try:
             while True:
                 user_input = input("\n👤 您: ")
                 
                 if "结束对话" in user_input or "结束" in user_input:
-                    print("🔄 检测到结束信号，正在自动保存...")
-                    self.auto_save_conversation()
+                    print("🔄 检测到结束信号，正在后台自动保存...")
                     break
                 else:
-                    self.conversation_buffer.append(f"�� 您: {user_input}")
+                    line = f"�� 您: {user_input}"
+                    self.conversation_buffer.append(line)
+                    writer.add(line)
                     
-        except KeyboardInterrupt:
-            print("\n🔄 手动结束，正在自动保存...")
-            self.auto_save_conversation()
+        except (KeyboardInterrupt, EOFError):
+            print("\n🔄 手动结束，正在后台自动保存...")
+        finally:
+            writer.finish()
+        return writer
     
     def auto_save_conversation(self):
         """自动保存对话"""
@@ -62,12 +173,6 @@ class AutoConversationSaver:
         
     def update_markdown_log(self, conversation, timestamp):
         """更新Markdown日志"""
-        if not self.log_file.exists():
-            self.create_initial_log()
-        
-        with open(self.log_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
         new_entry = f"""
 ### {timestamp} - 自动保存对话
 **对话内容**:
@@ -76,32 +181,16 @@ class AutoConversationSaver:
 ---
 """
         
-        if "## �� 对话记录" in content:
-            content = content.replace("## 📝 对话记录", f"## �� 对话记录{new_entry}")
-        else:
-            content += new_entry
-        
-        with open(self.log_file, 'w', encoding='utf-8') as f:
-            f.write(content)
+        self.log_writer.append(new_entry)
     
     def save_to_json(self, conversation, timestamp):
-        """保存到JSON文件"""
-        conversations = []
-        
-        if self.data_file.exists():
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                conversations = json.load(f)
-        
+        """保存到对话存储（id 由存储层递增分配）"""
         conversation_data = {
             "timestamp": timestamp,
-            "conversation": conversation,
-            "id": len(conversations) + 1
+            "conversation": conversation
         }
         
-        conversations.append(conversation_data)
-        
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(conversations, f, ensure_ascii=False, indent=2)
+        self.store.append(conversation_data)
     
     def create_initial_log(self):
         """创建初始日志"""
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对话记录冷数据归档
+较早的对话按 id 顺序压缩成只读分段，热存储只保留最近的对话
+"""
+
+import os
+import gzip
+import json
+from bisect import bisect_left
+from pathlib import Path
+
+from Conversation_Store import FileLock, conversation_text, normalize_since
+
+try:
+    import zstandard
+except ImportError:  # 未安装 zstandard 时使用标准库 gzip
+    zstandard = None
+
+
+def _compress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _decompress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _write_json(file_path, obj):
+    """先写临时文件再原子替换"""
+    tmp_file = file_path.with_suffix('.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, file_path)
+
+
+class ConversationArchive:
+    """
+    压缩归档分段
+
+    每个分段是一串独立压缩的数据块（每块 BLOCK_RECORDS 条 JSON Lines 记录），
+    gzip 分段本身仍是合法的 .gz 文件，可以直接 zcat 查看。
+    分段索引（.idx.json）记录每块的偏移、长度、id 范围、时间范围和标签集合：
+    按 id 读取只解压一个块；搜索时先按时间和标签跳过不可能命中的块。
+    catalog.json 记录所有分段的概要以及已归档的最大 id。
+    """
+
+    VERSION = 1
+    BLOCK_RECORDS = 256
+
+    def __init__(self, archive_dir):
+        self.archive_dir = Path(archive_dir)
+        self.catalog_file = self.archive_dir / "catalog.json"
+        self.lock = FileLock(self.archive_dir.with_name(self.archive_dir.name + '.lock'))
+        self.codec = "zstd" if zstandard is not None else "gzip"
+
+    def catalog(self):
+        """读取归档目录"""
+        if self.catalog_file.exists():
+            with open(self.catalog_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {"version": self.VERSION, "archived_through": 0, "segments": []}
+
+    def archived_through(self):
+        """已归档的最大 id（热存储中不大于它的记录都可以删除）"""
+        return self.catalog()["archived_through"]
+
+    def _segment_index(self, segment):
+        with open(self.archive_dir / segment["index"], 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _read_block(self, segment, block):
+        with open(self.archive_dir / segment["file"], 'rb') as f:
+            f.seek(block["offset"])
+            data = _decompress(f.read(block["length"]), segment["codec"])
+        return [json.loads(line) for line in data.decode('utf-8').splitlines() if line]
+
+    def _write_segment(self, name, conversations):
+        """把按 id 升序的对话写成分段文件和分段索引，返回分段概要（不修改目录）"""
+        segment = {"file": name + (".jsonl.zst" if self.codec == "zstd" else ".jsonl.gz"),
+                   "index": name + ".idx.json", "codec": self.codec}
+        blocks = []
+        tmp_file = self.archive_dir / (segment["file"] + ".tmp")
+        with open(tmp_file, 'wb') as f:
+            for start in range(0, len(conversations), self.BLOCK_RECORDS):
+                chunk = conversations[start:start + self.BLOCK_RECORDS]
+                data = ''.join(json.dumps(c, ensure_ascii=False) + '\n' for c in chunk).encode('utf-8')
+                compressed = _compress(data, self.codec)
+                timestamps = [c.get("timestamp", "") for c in chunk]
+                blocks.append({
+                    "offset": f.tell(),
+                    "length": len(compressed),
+                    "first_id": chunk[0]["id"],
+                    "last_id": chunk[-1]["id"],
+                    "min_ts": min(timestamps),
+                    "max_ts": max(timestamps),
+                    "tags": sorted({tag for c in chunk for tag in c.get("tags", [])}),
+                })
+                f.write(compressed)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.archive_dir / segment["file"])
+        _write_json(self.archive_dir / segment["index"], blocks)
+
+        segment.update({
+            "count": len(conversations),
+            "first_id": blocks[0]["first_id"],
+            "last_id": blocks[-1]["last_id"],
+            "min_ts": min(b["min_ts"] for b in blocks),
+            "max_ts": max(b["max_ts"] for b in blocks),
+            "size": sum(b["length"] for b in blocks),
+        })
+        return segment
+
+    def add_segment(self, conversations):
+        """把一批对话（按 id 升序，且 id 都大于已归档的最大 id）写成一个新分段"""
+        conversations = sorted(conversations, key=lambda c: c["id"])
+        if not conversations:
+            return None
+        with self.lock:
+            self.archive_dir.mkdir(parents=True, exist_ok=True)
+            catalog = self.catalog()
+            if conversations[0]["id"] <= catalog["archived_through"]:
+                raise ValueError(f"id {conversations[0]['id']} 已经归档过")
+
+            segment = self._write_segment(f"segment-{len(catalog['segments']) + 1:06d}", conversations)
+            catalog["segments"].append(segment)
+            catalog["archived_through"] = segment["last_id"]
+            # 目录最后更新：写入中途中断时，新分段不会被引用
+            _write_json(self.catalog_file, catalog)
+        return segment
+
+    def update_many(self, updates):
+        """
+        按 id 更新归档记录的部分字段（updates 为 {id: 字段字典}），返回实际更新的条数
+
+        分段只读，含有待更新记录的分段整体重写为新文件（块的标签集合随之更新），
+        目录一次性切换到新分段后再删除旧文件；中途中断时目录仍指向完整的旧分段。
+        """
+        updated = 0
+        with self.lock:
+            catalog = self.catalog()
+            ids = sorted(updates)
+            replaced = []
+            rewrites = catalog.get("rewrites", 0) + 1
+            for i, segment in enumerate(catalog["segments"]):
+                lo = bisect_left(ids, segment["first_id"])
+                if lo == len(ids) or ids[lo] > segment["last_id"]:
+                    continue
+                conversations = list(self._iter_segment(segment))
+                changed = 0
+                for conversation in conversations:
+                    fields = updates.get(conversation["id"])
+                    if fields is not None:
+                        conversation.update(fields)
+                        changed += 1
+                if not changed:
+                    continue
+                name = segment["file"].split('.', 1)[0].split('-r', 1)[0]
+                catalog["segments"][i] = self._write_segment(f"{name}-r{rewrites}", conversations)
+                replaced.append(segment)
+                updated += changed
+            if replaced:
+                catalog["rewrites"] = rewrites
+                _write_json(self.catalog_file, catalog)
+                for segment in replaced:
+                    (self.archive_dir / segment["file"]).unlink(missing_ok=True)
+                    (self.archive_dir / segment["index"]).unlink(missing_ok=True)
+        return updated
+
+    def _iter_segment(self, segment):
+        for block in self._segment_index(segment):
+            yield from self._read_block(segment, block)
+
+    def get(self, conversation_id):
+        """按 id 读取一条归档的对话，只解压所在的块"""
+        for segment in self.catalog()["segments"]:
+            if segment["first_id"] <= conversation_id <= segment["last_id"]:
+                blocks = self._segment_index(segment)
+                i = bisect_left([b["last_id"] for b in blocks], conversation_id)
+                if i < len(blocks) and blocks[i]["first_id"] <= conversation_id:
+                    for conversation in self._read_block(segment, blocks[i]):
+                        if conversation["id"] == conversation_id:
+                            return conversation
+                return None
+        return None
+
+    def iter_conversations(self, newest_first=False):
+        """按 id 顺序逐块读取所有归档的对话"""
+        segments = self.catalog()["segments"]
+        for segment in (reversed(segments) if newest_first else segments):
+            blocks = self._segment_index(segment)
+            for block in (reversed(blocks) if newest_first else blocks):
+                conversations = self._read_block(segment, block)
+                yield from (reversed(conversations) if newest_first else conversations)
+
+    def search(self, query="", tags=None, since=None, limit=20):
+        """在归档中搜索（关键词全部出现），从最新的对话开始，按块跳过不可能命中的部分"""
+        terms = query.split()
+        tags = set(tags or ())
+        since = normalize_since(since)
+        hits = []
+        for segment in reversed(self.catalog()["segments"]):
+            if since and segment["max_ts"] < since:
+                continue
+            for block in reversed(self._segment_index(segment)):
+                if since and block["max_ts"] < since:
+                    continue
+                if not tags.issubset(block["tags"]):
+                    continue
+                for conversation in reversed(self._read_block(segment, block)):
+                    if since and conversation.get("timestamp", "") < since:
+                        continue
+                    if not tags.issubset(conversation.get("tags", [])):
+                        continue
+                    text = conversation_text(conversation)
+                    if all(term in text for term in terms):
+                        hits.append(conversation)
+                        if len(hits) >= limit:
+                            return hits
+        return hits
+
+    def size(self):
+        """归档占用的字节数"""
+        return sum(segment["size"] for segment in self.catalog()["segments"])
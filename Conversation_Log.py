@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对话记录 Markdown 日志的增量写入器
+新条目只改写文件尾部和统计字段，不再整体读取、替换、写回
+"""
+
+import os
+import re
+import json
+import datetime
+from pathlib import Path
+
+from Conversation_Store import FileLock
+
+
+class MarkdownLogWriter:
+    """
+    AI_Conversation_Log.md 的增量写入器
+
+    新条目按时间顺序插入到对话记录部分的末尾（"快速搜索"页脚之前）：
+    只需截断并重写页脚（几百字节），再原地覆盖统计部分的"总对话次数"和"最后更新"。
+    插入位置、统计字段的字节偏移和条目数保存在旁边的 .index.json 中；
+    日志被手动编辑（长度或修改时间对不上）时重新扫描一次文件即可恢复。
+    多个保存程序同时写入时由锁文件串行化。
+    """
+
+    VERSION = 1
+    RECORDS_HEADER = "## 📝 对话记录".encode('utf-8')
+    FOOTER_MARKER = "\n---\n\n## 🔍 快速搜索".encode('utf-8')
+    COUNT_PREFIX = "- **总对话次数**: ".encode('utf-8')
+    UPDATED_PREFIX = "- **最后更新**: ".encode('utf-8')
+    FOOTER_DATE = re.compile(r'\*最后更新: \d{4}-\d{2}-\d{2}'.encode('utf-8'))
+    DATE = re.compile(rb'\d{4}-\d{2}-\d{2}')
+    # 统计字段与页脚只在文件的开头和结尾查找
+    HEAD_LIMIT = 64 * 1024
+    TAIL_LIMIT = 64 * 1024
+    # 对话次数字段预留的宽度，位数增加时不必移动后面的内容
+    COUNT_WIDTH = 10
+
+    def __init__(self, log_file, create_initial_log):
+        self.log_file = Path(log_file)
+        self.index_file = self.log_file.with_name(self.log_file.name + '.index.json')
+        self.create_initial_log = create_initial_log
+        self.lock = FileLock(self.log_file.with_name(self.log_file.name + '.lock'))
+
+    def _load_index(self):
+        """读取偏移索引，与日志文件当前状态不一致时重新扫描"""
+        stat = self.log_file.stat()
+        if self.index_file.exists():
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                if (index.get("version") == self.VERSION and index["size"] == stat.st_size
+                        and index["mtime_ns"] == stat.st_mtime_ns):
+                    return index
+            except (OSError, ValueError, KeyError):
+                pass
+        return self._scan(stat.st_size)
+
+    def _save_index(self, index):
+        stat = self.log_file.stat()
+        index["size"] = stat.st_size
+        index["mtime_ns"] = stat.st_mtime_ns
+        tmp_file = self.index_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_file, self.index_file)
+
+    def _scan(self, size):
+        """扫描日志文件，定位插入点和统计字段"""
+        index = {"version": self.VERSION, "insert_offset": size, "count": 0, "newline": "\n",
+                 "count_offset": None, "count_width": 0, "updated_offset": None}
+        with open(self.log_file, 'rb') as f:
+            head = f.read(self.HEAD_LIMIT)
+            # 在 Windows 上以文本模式创建的日志使用 \r\n 换行，新条目保持一致
+            if b'\r\n' in head:
+                index["newline"] = "\r\n"
+            newline = index["newline"].encode('ascii')
+            # 统计字段只认对话记录部分之前的那一处，避免匹配到条目正文
+            records_at = head.find(self.RECORDS_HEADER)
+            if records_at >= 0:
+                for key, prefix in (("count_offset", self.COUNT_PREFIX), ("updated_offset", self.UPDATED_PREFIX)):
+                    at = head.find(prefix, 0, records_at)
+                    if at >= 0:
+                        index[key] = at + len(prefix)
+                if index["count_offset"] is not None:
+                    end = head.find(newline, index["count_offset"])
+                    index["count_width"] = (end if end >= 0 else len(head)) - index["count_offset"]
+                updated_at = index["updated_offset"]
+                if updated_at is not None and not self.DATE.match(head, updated_at):
+                    index["updated_offset"] = None
+
+            # 页脚之后没有条目时插入到页脚之前，否则（旧版日志把条目追加在页脚之后）追加到文件末尾
+            tail_start = max(0, size - self.TAIL_LIMIT)
+            f.seek(tail_start)
+            tail = f.read()
+            at = tail.rfind(self.FOOTER_MARKER.replace(b'\n', newline))
+            if at >= 0 and b'\n### ' not in tail[at:]:
+                index["insert_offset"] = tail_start + at
+
+            # 条目数按 "### " 开头的行统计，逐行读取，内存占用与文件大小无关
+            f.seek(0)
+            index["count"] = sum(1 for line in f if line.startswith(b'### '))
+        return index
+
+    def _widen_count_field(self, index):
+        """对话次数字段放不下新值时，整体重写一次文件，把字段扩展到预留宽度"""
+        offset, width = index["count_offset"], index["count_width"]
+        tmp_file = self.log_file.with_suffix('.tmp')
+        with open(self.log_file, 'rb') as src, open(tmp_file, 'wb') as dst:
+            dst.write(src.read(offset))
+            dst.write(b' ' * self.COUNT_WIDTH)
+            src.seek(offset + width)
+            while True:
+                chunk = src.read(1024 * 1024)
+                if not chunk:
+                    break
+                dst.write(chunk)
+        os.replace(tmp_file, self.log_file)
+
+        shift = self.COUNT_WIDTH - width
+        if index["updated_offset"] is not None and index["updated_offset"] > offset:
+            index["updated_offset"] += shift
+        index["insert_offset"] += shift
+        index["count_width"] = self.COUNT_WIDTH
+
+    def append(self, entry):
+        """写入一条新的对话条目并更新统计"""
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        """一次写入多条对话条目，统计和页脚只更新一次"""
+        entries = list(entries)
+        if not entries:
+            return
+        with self.lock:
+            self._append_locked(entries)
+
+    def _append_locked(self, entries):
+        if not self.log_file.exists():
+            self.create_initial_log()
+        index = self._load_index()
+
+        count = str(index["count"] + len(entries)).encode('utf-8')
+        if index["count_offset"] is not None and len(count) > index["count_width"]:
+            self._widen_count_field(index)
+
+        today = datetime.date.today().strftime("%Y-%m-%d").encode('utf-8')
+        data = ''.join(entries).replace('\n', index["newline"]).encode('utf-8')
+        with open(self.log_file, 'r+b') as f:
+            # 只重写插入点之后的页脚
+            f.seek(index["insert_offset"])
+            footer = self.FOOTER_DATE.sub(b'*' + "最后更新: ".encode('utf-8') + today, f.read())
+            f.seek(index["insert_offset"])
+            f.write(data)
+            f.write(footer)
+            f.truncate()
+
+            # 统计字段原地覆盖，长度不变
+            if index["count_offset"] is not None:
+                f.seek(index["count_offset"])
+                f.write(count.ljust(index["count_width"]))
+            if index["updated_offset"] is not None:
+                f.seek(index["updated_offset"])
+                f.write(today)
+
+        index["insert_offset"] += len(data)
+        index["count"] += len(entries)
+        self._save_index(index)
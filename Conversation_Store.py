@@ -0,0 +1,863 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对话记录存储后端
+为 SmartConversationManager 提供统一的读写接口
+
+所有写入都在进程间建议锁内完成，覆盖写入先写临时文件再原子替换，
+id 按已有最大 id 递增分配，多个保存程序同时运行也不会丢失记录或重复 id。
+所有保存程序都应通过 open_store() 打开存储，共用同一个后端、同一把锁和同一个 id 序列。
+"""
+
+import os
+import json
+import sqlite3
+import datetime
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 默认存储后端，可用环境变量 CONVERSATION_STORAGE 统一切换（jsonl、sqlite 或 json）
+DEFAULT_STORAGE = os.environ.get("CONVERSATION_STORAGE", "jsonl")
+
+
+class FileLock:
+    """
+    基于锁文件的进程间建议锁
+
+    POSIX 上使用 flock，Windows 上使用 msvcrt.locking；
+    同一进程内的线程先经过 RLock，同一线程可重入。
+    """
+
+    def __init__(self, lock_file):
+        self.lock_file = Path(lock_file)
+        self._mutex = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._mutex.acquire()
+        if self._depth == 0:
+            f = open(self.lock_file, 'a+b')
+            try:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                else:
+                    f.seek(0)
+                    while True:
+                        try:
+                            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            continue  # LK_LOCK 重试 10 秒后仍未拿到锁，继续等待
+            except BaseException:
+                f.close()
+                self._mutex.release()
+                raise
+            self._file = f
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            f, self._file = self._file, None
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            f.close()
+        self._mutex.release()
+
+
+class GroupCommit:
+    """
+    组提交：同一进程中多个线程同时追加时，合并为一次写入
+
+    第一个到达的线程成为提交者，把队列中已有的记录通过 append_many 一次写入（一次 fsync）；
+    其余线程等待自己的记录写入后返回，写入失败时各自抛出同一个异常。
+    """
+
+    def _init_group_commit(self):
+        self._commit_cond = threading.Condition()
+        self._commit_queue = []
+        self._committing = False
+
+    def append(self, conversation):
+        """追加一条对话记录并分配 id"""
+        request = {"conversation": conversation, "done": False, "error": None}
+        batch = None
+        with self._commit_cond:
+            self._commit_queue.append(request)
+            while self._committing and not request["done"]:
+                self._commit_cond.wait()
+            if not request["done"]:
+                self._committing = True
+                batch, self._commit_queue = self._commit_queue, []
+
+        if batch is not None:
+            error = None
+            try:
+                self.append_many([r["conversation"] for r in batch])
+            except BaseException as e:
+                error = e
+            with self._commit_cond:
+                for r in batch:
+                    r["done"] = True
+                    r["error"] = error
+                self._committing = False
+                self._commit_cond.notify_all()
+
+        if request["error"] is not None:
+            raise request["error"]
+        return conversation
+
+
+def normalize_since(since):
+    """since 可以是日期/时间对象或 "YYYY-MM-DD[ HH:MM]" 字符串，统一为可与 timestamp 直接比较的字符串"""
+    if isinstance(since, (datetime.date, datetime.datetime)):
+        return since.strftime("%Y-%m-%d %H:%M")
+    return since or None
+
+
+def conversation_text(conversation):
+    """对话中参与关键词搜索的文本：问题、回答（旧版记录为对话内容）、关键要点和后续行动"""
+    return " ".join([conversation.get("question", ""), conversation.get("answer") or conversation.get("conversation", ""),
+                     *conversation.get("key_points", []), *conversation.get("follow_up", [])])
+
+
+def _reversed_lines(f, end, block_size=64 * 1024):
+    """从 end 位置开始倒序逐行读取文件，内存占用与文件大小无关"""
+    pos = end
+    rest = b''
+    while pos > 0:
+        step = min(block_size, pos)
+        pos -= step
+        f.seek(pos)
+        lines = (f.read(step) + rest).split(b'\n')
+        rest = lines.pop(0)
+        for line in reversed(lines):
+            if line:
+                yield line
+    if rest:
+        yield rest
+
+
+def _next_id(conversations):
+    """下一个可用 id：已有最大 id 加一（删除记录后也不会重复）"""
+    return max((int(c.get("id", 0)) for c in conversations), default=0) + 1
+
+
+def _apply_updates(conversations, updates):
+    """把 {id: 字段字典} 合并到对应的记录中，返回实际更新的条数"""
+    updated = 0
+    for conversation in conversations:
+        fields = updates.get(int(conversation.get("id", 0)))
+        if fields is not None:
+            conversation.update(fields)
+            updated += 1
+    return updated
+
+
+class JsonArrayStore(GroupCommit):
+    """旧版存储：整个对话列表保存为一个 JSON 数组，每次写入都重写整个文件"""
+
+    def __init__(self, data_file):
+        self.data_file = Path(data_file)
+        self.lock = FileLock(self.data_file.with_name(self.data_file.name + '.lock'))
+        self._init_group_commit()
+
+    def _read(self):
+        if self.data_file.exists():
+            with open(self.data_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return []
+
+    def _write(self, conversations):
+        tmp_file = self.data_file.with_suffix('.json.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(conversations, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.data_file)
+
+    def load_all(self):
+        """读取所有对话记录"""
+        with self.lock:
+            return self._read()
+
+    def replace_all(self, conversations):
+        """用给定列表覆盖所有对话记录（先写临时文件再原子替换）"""
+        with self.lock:
+            self._write(conversations)
+
+    def append_many(self, conversations):
+        """批量追加对话记录：在锁内只读写一次文件"""
+        conversations = list(conversations)
+        with self.lock:
+            existing = self._read()
+            for i, conversation in enumerate(conversations, _next_id(existing)):
+                conversation["id"] = i
+            self._write(existing + conversations)
+        return conversations
+
+    def remove_through(self, max_id):
+        """删除 id 不大于 max_id 的记录（已移入归档），返回删除条数"""
+        with self.lock:
+            conversations = self._read()
+            kept = [c for c in conversations if int(c.get("id", 0)) > max_id]
+            if len(kept) < len(conversations):
+                self._write(kept)
+        return len(conversations) - len(kept)
+
+    def update_many(self, updates):
+        """按 id 更新记录的部分字段（updates 为 {id: 字段字典}），锁内读写，期间新增的记录不受影响"""
+        with self.lock:
+            conversations = self._read()
+            updated = _apply_updates(conversations, updates)
+            if updated:
+                self._write(conversations)
+        return updated
+
+    def iter_conversations(self, since=None, tags=None, limit=None, offset=0, newest_first=False):
+        """按条件逐条读取对话记录（JSON 数组只能整体读取后再筛选）"""
+        since = normalize_since(since)
+        tags = set(tags or ())
+        conversations = self.load_all()
+        if newest_first:
+            conversations.reverse()
+        returned = 0
+        for conversation in conversations:
+            if limit is not None and returned >= limit:
+                break
+            if since and conversation.get("timestamp", "") < since:
+                continue
+            if tags and not tags.issubset(conversation.get("tags", [])):
+                continue
+            if offset > 0:
+                offset -= 1
+                continue
+            yield conversation
+            returned += 1
+
+
+class JsonlStore(GroupCommit):
+    """
+    追加写入的 JSON Lines 存储
+
+    每条对话占一行，新增对话只需在文件末尾追加一行并 fsync，耗时与历史记录数量无关。
+    旁边的小头文件记录下一个 id、记录数和已确认的文件长度；
+    若程序在写完数据、更新头文件之前中断，下次打开时只扫描多出来的尾部即可恢复。
+    每次操作都在锁内重新读取头文件，其他进程写入的记录立即可见。
+
+    偏移索引（.index.jsonl）每条记录一行：[字节偏移, 长度, timestamp, tags]，
+    iter_conversations() 只凭索引筛选和分页，只解码真正返回的记录。
+    索引可由数据文件重建，落后于数据时在下次打开时补齐。
+    """
+
+    VERSION = 1
+
+    def __init__(self, data_file, legacy_file=None):
+        self.data_file = Path(data_file)
+        self.header_file = self.data_file.with_suffix('.meta.json')
+        self.index_file = self.data_file.with_suffix('.index.jsonl')
+        self.legacy_file = Path(legacy_file) if legacy_file else None
+        self.lock = FileLock(self.data_file.with_name(self.data_file.name + '.lock'))
+        self._init_group_commit()
+
+    def _read_header(self):
+        if self.header_file.exists():
+            try:
+                with open(self.header_file, 'r', encoding='utf-8') as f:
+                    header = json.load(f)
+                if header.get("version") == self.VERSION:
+                    return header
+            except (OSError, ValueError):
+                pass
+        # 头文件缺失或损坏时从数据文件完整重建
+        return {"version": self.VERSION, "next_id": 1, "count": 0, "size": 0}
+
+    def _write_header(self, header):
+        tmp_file = self.header_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(header, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.header_file)
+
+    def _scan(self, header, start):
+        """扫描数据文件从 start 开始的部分，更新记录数和下一个 id，返回最后一个完整行的结束位置"""
+        end = start
+        with open(self.data_file, 'rb') as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # 未写完的行
+                end += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                header["count"] += 1
+                header["next_id"] = max(header["next_id"], int(record.get("id", 0)) + 1)
+        return end
+
+    def _ensure_open(self):
+        """读取并校验头文件，首次使用时迁移旧数据（调用方需持有锁）"""
+        if not self.data_file.exists():
+            self._migrate_legacy()
+            self.data_file.touch()
+
+        header = self._read_header()
+        size = self.data_file.stat().st_size
+        if header["size"] > size:
+            # 头文件比数据新（数据文件被替换过），重新完整扫描
+            header = {"version": self.VERSION, "next_id": 1, "count": 0, "size": 0}
+        if header["size"] < size:
+            end = self._scan(header, header["size"])
+            if end < size:
+                # 截掉中断写入留下的不完整行
+                with open(self.data_file, 'r+b') as f:
+                    f.truncate(end)
+            header["size"] = end
+            self._write_header(header)
+        self._sync_index(header["size"])
+        return header
+
+    @staticmethod
+    def _index_entry(offset, length, conversation):
+        return json.dumps([offset, length, conversation.get("timestamp", ""), conversation.get("tags", [])],
+                          ensure_ascii=False) + '\n'
+
+    def _sync_index(self, size):
+        """让偏移索引覆盖数据文件的前 size 字节（调用方需持有锁）"""
+        covered = 0
+        rebuild = False
+        if self.index_file.exists():
+            with open(self.index_file, 'r+b') as f:
+                index_size = f.seek(0, os.SEEK_END)
+                tail_start = max(0, index_size - 64 * 1024)
+                f.seek(tail_start)
+                tail = f.read()
+                end = tail.rfind(b'\n') + 1
+                if tail_start + end < index_size:
+                    f.truncate(tail_start + end)  # 截掉未写完的索引行
+                if end == 0:
+                    # 没有完整的索引行（首次写索引时中断），从头重建
+                    rebuild = tail_start > 0
+                else:
+                    try:
+                        offset, length = json.loads(tail[:end - 1].rsplit(b'\n', 1)[-1])[:2]
+                        covered = offset + length
+                    except (ValueError, TypeError):
+                        rebuild = True  # 最后一行索引损坏
+        if rebuild or covered > size:
+            # 索引损坏或数据文件被替换过，索引整体重建
+            covered = 0
+            self.index_file.unlink()
+        if covered < size:
+            entries = []
+            with open(self.data_file, 'rb') as f:
+                f.seek(covered)
+                offset = covered
+                while offset < size:
+                    line = f.readline()
+                    try:
+                        if line.strip():
+                            entries.append(self._index_entry(offset, len(line), json.loads(line)))
+                    except ValueError:
+                        pass
+                    offset += len(line)
+            with open(self.index_file, 'a', encoding='utf-8') as f:
+                f.writelines(entries)
+
+    def _migrate_legacy(self):
+        """把旧版 JSON 数组文件转换为 JSON Lines（旧文件保留不动）"""
+        if not self.legacy_file or not self.legacy_file.exists():
+            return
+        # 旧文件可能仍有其他保存程序在写入，按其锁读取
+        conversations = JsonArrayStore(self.legacy_file).load_all()
+        self.replace_all(conversations)
+        print(f"📦 已将 {len(conversations)} 条旧对话记录迁移到 {self.data_file.name}")
+
+    def load_all(self):
+        """读取所有对话记录"""
+        with self.lock:
+            header = self._ensure_open()
+            conversations = []
+            with open(self.data_file, 'rb') as f:
+                # 只读取头文件确认过的部分
+                for line in f.read(header["size"]).decode('utf-8').splitlines():
+                    if line.strip():
+                        conversations.append(json.loads(line))
+        return conversations
+
+    def count(self):
+        """对话记录数（只读头文件，不读取数据）"""
+        with self.lock:
+            return self._ensure_open()["count"]
+
+    def append_many(self, conversations):
+        """批量追加对话记录：所有行一次写入，只 fsync 和更新头文件一次"""
+        conversations = list(conversations)
+        with self.lock:
+            header = self._ensure_open()
+            lines, entries = [], []
+            offset = header["size"]
+            for i, conversation in enumerate(conversations, header["next_id"]):
+                conversation["id"] = i
+                line = (json.dumps(conversation, ensure_ascii=False) + '\n').encode('utf-8')
+                lines.append(line)
+                entries.append(self._index_entry(offset, len(line), conversation))
+                offset += len(line)
+            data = b''.join(lines)
+            with open(self.data_file, 'ab') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            # 索引可以重建，不需要 fsync
+            with open(self.index_file, 'a', encoding='utf-8') as f:
+                f.writelines(entries)
+            header["next_id"] += len(conversations)
+            header["count"] += len(conversations)
+            header["size"] += len(data)
+            self._write_header(header)
+        return conversations
+
+    def replace_all(self, conversations):
+        """用给定列表覆盖所有对话记录（先写临时文件再原子替换）"""
+        with self.lock:
+            self._replace_all(conversations)
+
+    def remove_through(self, max_id):
+        """删除 id 不大于 max_id 的记录（已移入归档），返回删除条数"""
+        with self.lock:
+            conversations = self.load_all()
+            kept = [c for c in conversations if int(c.get("id", 0)) > max_id]
+            if len(kept) < len(conversations):
+                self._replace_all(kept)
+        return len(conversations) - len(kept)
+
+    def update_many(self, updates):
+        """按 id 更新记录的部分字段（updates 为 {id: 字段字典}），锁内重写，期间新增的记录不受影响"""
+        with self.lock:
+            conversations = self.load_all()
+            updated = _apply_updates(conversations, updates)
+            if updated:
+                self._replace_all(conversations)
+        return updated
+
+    def _replace_all(self, conversations):
+        header = {"version": self.VERSION, "next_id": 1, "count": 0, "size": 0}
+        tmp_file = self.data_file.with_suffix('.jsonl.tmp')
+        tmp_index = self.index_file.with_suffix('.tmp')
+        with open(tmp_file, 'wb') as f, open(tmp_index, 'w', encoding='utf-8') as index:
+            for conversation in conversations:
+                line = (json.dumps(conversation, ensure_ascii=False) + '\n').encode('utf-8')
+                f.write(line)
+                index.write(self._index_entry(header["size"], len(line), conversation))
+                header["size"] += len(line)
+                header["count"] += 1
+                header["next_id"] = max(header["next_id"], int(conversation.get("id", 0)) + 1)
+            f.flush()
+            os.fsync(f.fileno())
+        # 先删除旧索引：替换中途中断时，下次打开会按新数据重建索引
+        self.index_file.unlink(missing_ok=True)
+        os.replace(tmp_file, self.data_file)
+        os.replace(tmp_index, self.index_file)
+        self._write_header(header)
+
+    def iter_conversations(self, since=None, tags=None, limit=None, offset=0, newest_first=False):
+        """
+        按条件逐条读取对话记录
+
+        只在索引上按 since（timestamp 不早于该时间）和 tags（包含全部标签）筛选、跳过 offset 条，
+        然后按偏移读取并解码最多 limit 条记录；newest_first 为 True 时从最新的记录开始。
+        """
+        since = normalize_since(since)
+        tags = set(tags or ())
+        # 在锁内确定快照范围并打开文件，之后的追加不影响本次读取
+        with self.lock:
+            self._ensure_open()
+            data = open(self.data_file, 'rb')
+            index = open(self.index_file, 'rb')
+            index_end = index.seek(0, os.SEEK_END)
+        try:
+            if newest_first:
+                entries = _reversed_lines(index, index_end)
+            else:
+                index.seek(0)
+                entries = iter(index.readline, b'')
+            returned = 0
+            for entry in entries:
+                if limit is not None and returned >= limit:
+                    break
+                record_offset, length, timestamp, record_tags = json.loads(entry)
+                if since and timestamp < since:
+                    continue
+                if tags and not tags.issubset(record_tags):
+                    continue
+                if offset > 0:
+                    offset -= 1
+                    continue
+                data.seek(record_offset)
+                yield json.loads(data.read(length))
+                returned += 1
+        finally:
+            data.close()
+            index.close()
+
+
+# 中日韩文字没有空格分词，建立全文索引前在每个汉字两侧加空格，按单字切分
+# （用 str.translate 查表替换，比正则替换快一个数量级，批量导入时差别明显）
+_CJK_RANGES = ((0x3040, 0x30ff), (0x3400, 0x4dbf), (0x4e00, 0x9fff), (0xf900, 0xfaff))
+_CJK_SPACED = {cp: f' {chr(cp)} ' for start, end in _CJK_RANGES for cp in range(start, end + 1)}
+
+# 对话记录的标准字段，其余字段保存在 extra 列中
+_CONVERSATION_FIELDS = ("timestamp", "question", "answer", "key_points", "tags", "follow_up")
+
+
+def _segment(text):
+    """把文本切分为全文索引使用的词元"""
+    return (text or '').translate(_CJK_SPACED)
+
+
+def _fts_query(query):
+    """把用户查询转换为 FTS5 查询：每个关键词按单字切分后作为短语，多个关键词同时匹配"""
+    phrases = []
+    for term in query.split():
+        # 只由标点组成的词元不会被索引，作为短语会变成空短语而使整个查询没有结果，直接丢弃
+        tokens = [token for token in _segment(term).split() if any(ch.isalnum() for ch in token)]
+        if tokens:
+            phrases.append('"' + ' '.join(token.replace('"', '""') for token in tokens) + '"')
+    return ' AND '.join(phrases)
+
+
+class SqliteStore(GroupCommit):
+    """
+    SQLite 存储（WAL 模式），带全文检索
+
+    conversations 表按 id 存储对话，timestamp 建有索引；
+    conversation_tags 表保存 (标签, 对话 id)，用于按标签过滤；
+    conversations_fts 是 FTS5 全文索引，覆盖问题、回答、关键要点和后续行动，
+    search() 按 bm25 相关度排序返回结果。
+    写事务使用 BEGIN IMMEDIATE，多个进程同时写入时由 SQLite 排队，id 不会冲突。
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS conversations (
+        id INTEGER PRIMARY KEY,
+        timestamp TEXT NOT NULL,
+        question TEXT,
+        answer TEXT,
+        key_points TEXT,
+        tags TEXT,
+        follow_up TEXT,
+        extra TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations(timestamp);
+    CREATE TABLE IF NOT EXISTS conversation_tags (
+        tag TEXT NOT NULL,
+        conversation_id INTEGER NOT NULL,
+        PRIMARY KEY (tag, conversation_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_conversation_tags_id ON conversation_tags(conversation_id);
+    CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(
+        question, answer, key_points, follow_up
+    );
+    """
+
+    # iter_conversations() 每次查询的行数
+    PAGE_SIZE = 500
+
+    def __init__(self, db_file, legacy_store=None):
+        self.db_file = Path(db_file)
+        self.legacy_store = legacy_store
+        self._conn = None
+        # 同一连接在多个线程间共享，由 _mutex 串行化
+        self._mutex = threading.RLock()
+        self._init_group_commit()
+
+    def _connect(self):
+        """打开数据库并建表；数据库为空时从旧存储迁移"""
+        if self._conn is not None:
+            return self._conn
+        conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(self.SCHEMA)
+        self._conn = conn
+        if self.legacy_store is not None and self.count() == 0:
+            # 检查和导入在同一个写事务中：多个进程同时首次打开时只有一个会迁移，其余看到已导入的数据
+            with self._transaction():
+                if conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0] == 0:
+                    conversations = self.legacy_store.load_all()
+                    if conversations:
+                        self._write_rows(conversations)
+                        print(f"📦 已将 {len(conversations)} 条旧对话记录迁移到 {self.db_file.name}")
+        return conn
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._mutex:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @contextmanager
+    def _transaction(self):
+        """写事务：一开始就取得写锁，避免多个进程读到相同的最大 id"""
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _insert_many(self, conversations):
+        """在一个事务中写入多条对话，没有 id 的对话按顺序分配新 id"""
+        with self._transaction():
+            return self._write_rows(conversations)
+
+    def _write_rows(self, conversations):
+        """写入多条对话（由调用方负责事务）"""
+        conn = self._conn
+        rows, tag_rows, fts_rows = [], [], []
+        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM conversations").fetchone()[0]
+        for conversation in conversations:
+            if not conversation.get("id"):
+                conversation["id"] = next_id
+            next_id = max(next_id, int(conversation["id"]) + 1)
+            extra = {k: v for k, v in conversation.items() if k not in _CONVERSATION_FIELDS and k != "id"}
+            key_points = conversation.get("key_points", [])
+            follow_up = conversation.get("follow_up", [])
+            tags = conversation.get("tags", [])
+            rows.append((conversation["id"], conversation.get("timestamp", ""),
+                         conversation.get("question"), conversation.get("answer"),
+                         json.dumps(key_points, ensure_ascii=False), json.dumps(tags, ensure_ascii=False),
+                         json.dumps(follow_up, ensure_ascii=False),
+                         json.dumps(extra, ensure_ascii=False) if extra else None))
+            tag_rows.extend((tag, conversation["id"]) for tag in tags)
+            # 旧版记录只有 conversation 字段，也一并索引到回答列
+            answer = conversation.get("answer") or conversation.get("conversation")
+            fts_rows.append((conversation["id"], _segment(conversation.get("question")), _segment(answer),
+                             _segment(' '.join(key_points)), _segment(' '.join(follow_up))))
+        conn.executemany(
+            "INSERT INTO conversations (id, timestamp, question, answer, key_points, tags, follow_up, extra)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.executemany(
+            "INSERT OR IGNORE INTO conversation_tags (tag, conversation_id) VALUES (?, ?)", tag_rows)
+        conn.executemany(
+            "INSERT INTO conversations_fts (rowid, question, answer, key_points, follow_up)"
+            " VALUES (?, ?, ?, ?, ?)", fts_rows)
+        return conversations
+
+    @staticmethod
+    def _row_to_conversation(row):
+        conversation = {
+            "timestamp": row["timestamp"],
+            "question": row["question"],
+            "answer": row["answer"],
+            "key_points": json.loads(row["key_points"]),
+            "tags": json.loads(row["tags"]),
+            "follow_up": json.loads(row["follow_up"]),
+        }
+        # 旧版记录没有的字段不补出来，保持与原始记录一致
+        if row["extra"]:
+            for key in ("question", "answer"):
+                if conversation[key] is None:
+                    del conversation[key]
+            conversation.update(json.loads(row["extra"]))
+        conversation["id"] = row["id"]
+        return conversation
+
+    def load_all(self):
+        """读取所有对话记录（按 id 排序）"""
+        with self._mutex:
+            rows = self._connect().execute("SELECT * FROM conversations ORDER BY id").fetchall()
+        return [self._row_to_conversation(row) for row in rows]
+
+    def count(self):
+        """对话记录数"""
+        with self._mutex:
+            return self._connect().execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+    def append_many(self, conversations):
+        """批量追加对话记录：在一个事务中写入"""
+        conversations = list(conversations)
+        for conversation in conversations:
+            conversation.pop("id", None)
+        with self._mutex:
+            self._connect()
+            return self._insert_many(conversations)
+
+    def replace_all(self, conversations):
+        """用给定列表覆盖所有对话记录"""
+        with self._mutex:
+            self._connect()
+            # 删除与重新写入在同一个事务中，中途失败时数据保持原样
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM conversations")
+                conn.execute("DELETE FROM conversation_tags")
+                conn.execute("DELETE FROM conversations_fts")
+                self._write_rows(conversations)
+
+    def search(self, query="", tags=None, since=None, limit=20):
+        """
+        全文搜索对话记录
+
+        query 中以空格分隔的关键词必须全部出现（只由标点组成的关键词忽略），结果按相关度排序；
+        tags 给定时只返回包含所有这些标签的对话；since 给定时只返回该时间之后的对话。
+        query 为空时只按标签和时间过滤，按时间倒序返回。
+        """
+        filters, params = self._filters(tags, since)
+        match = _fts_query(query or '')
+        if not match and (query or '').strip():
+            return []  # 关键词全是标点，没有可以检索的内容
+        if match:
+            sql = ("SELECT c.*, bm25(conversations_fts) AS score FROM conversations_fts"
+                   " JOIN conversations c ON c.id = conversations_fts.rowid"
+                   " WHERE conversations_fts MATCH ?")
+            params.insert(0, match)
+            order = "score"
+        else:
+            sql = "SELECT c.* FROM conversations c WHERE 1"
+            order = "c.timestamp DESC, c.id DESC"
+        sql += filters + f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+        with self._mutex:
+            rows = self._connect().execute(sql, params).fetchall()
+        return [self._row_to_conversation(row) for row in rows]
+
+    def update_many(self, updates):
+        """
+        按 id 更新记录的部分字段（updates 为 {id: 字段字典}），在一个事务中完成
+
+        只改写给定的字段，标签表和全文索引随之更新；已删除（已归档）的 id 跳过，期间新增的记录不受影响。
+        """
+        ids = list(updates)
+        with self._mutex:
+            self._connect()
+            with self._transaction() as conn:
+                conversations = []
+                for i in range(0, len(ids), self.PAGE_SIZE):
+                    chunk = ids[i:i + self.PAGE_SIZE]
+                    rows = conn.execute("SELECT * FROM conversations WHERE id IN (%s)" % ','.join('?' * len(chunk)),
+                                        chunk).fetchall()
+                    for row in rows:
+                        conversation = self._row_to_conversation(row)
+                        conversation.update(updates[row["id"]])
+                        conversations.append(conversation)
+                # 删除旧行后按原 id 重新写入，标签表和全文索引一并更新
+                params = [(c["id"],) for c in conversations]
+                conn.executemany("DELETE FROM conversations WHERE id = ?", params)
+                conn.executemany("DELETE FROM conversation_tags WHERE conversation_id = ?", params)
+                conn.executemany("DELETE FROM conversations_fts WHERE rowid = ?", params)
+                self._write_rows(conversations)
+        return len(conversations)
+
+    def remove_through(self, max_id):
+        """删除 id 不大于 max_id 的记录（已移入归档），返回删除条数"""
+        with self._mutex:
+            self._connect()
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM conversation_tags WHERE conversation_id <= ?", (max_id,))
+                conn.execute("DELETE FROM conversations_fts WHERE rowid <= ?", (max_id,))
+                removed = conn.execute("DELETE FROM conversations WHERE id <= ?", (max_id,)).rowcount
+            if removed:
+                self.vacuum()
+        return removed
+
+    def vacuum(self):
+        """
+        回收已删除记录占用的磁盘空间
+
+        DELETE 只把页面标记为空闲，数据库文件不会变小；先把 WAL 写回主库并截断，
+        再 VACUUM 重建数据库文件（VACUUM 本身也写入 WAL，之后再截断一次）。
+        VACUUM 不能在事务中执行，需要等待其他连接的读写结束。
+        """
+        with self._mutex:
+            conn = self._connect()
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    @staticmethod
+    def _filters(tags, since):
+        """按标签（全部包含）和时间过滤的 SQL 条件及参数"""
+        sql, params = "", []
+        since = normalize_since(since)
+        if since:
+            sql += " AND c.timestamp >= ?"
+            params.append(since)
+        if tags:
+            tags = list(dict.fromkeys(tags))
+            sql += (" AND c.id IN (SELECT conversation_id FROM conversation_tags WHERE tag IN (%s)"
+                    " GROUP BY conversation_id HAVING COUNT(*) = ?)" % ','.join('?' * len(tags)))
+            params.extend(tags)
+            params.append(len(tags))
+        return sql, params
+
+    def iter_conversations(self, since=None, tags=None, limit=None, offset=0, newest_first=False):
+        """按条件逐条读取对话记录：按 id 分页查询，每次只取一页，不持有连接等待调用方"""
+        filters, params = self._filters(tags, since)
+        op, order = ("<", "DESC") if newest_first else (">", "ASC")
+        last_id = None
+        remaining = limit
+        while remaining is None or remaining > 0:
+            page = self.PAGE_SIZE if remaining is None else min(self.PAGE_SIZE, remaining)
+            sql = "SELECT c.* FROM conversations c WHERE 1" + filters
+            args = list(params)
+            if last_id is not None:
+                sql += f" AND c.id {op} ?"
+                args.append(last_id)
+            sql += f" ORDER BY c.id {order} LIMIT ? OFFSET ?"
+            args += [page, offset if last_id is None else 0]
+            with self._mutex:
+                rows = self._connect().execute(sql, args).fetchall()
+            for row in rows:
+                yield self._row_to_conversation(row)
+            if len(rows) < page:
+                return
+            last_id = rows[-1]["id"]
+            if remaining is not None:
+                remaining -= len(rows)
+
+
+def open_store(base_path, storage=None):
+    """
+    按名称创建存储后端：jsonl（追加写入）、sqlite（带全文检索）或 json（旧版 JSON 数组）
+
+    storage 省略时使用 DEFAULT_STORAGE；同一目录下的各个保存程序应使用同一种后端，
+    否则各自写入不同的文件，记录互相看不到。
+    """
+    base_path = Path(base_path)
+    storage = storage or DEFAULT_STORAGE
+    legacy_file = base_path / "conversation_data.json"
+    jsonl_file = base_path / "conversation_data.jsonl"
+    if storage == "json":
+        return JsonArrayStore(legacy_file)
+    if storage == "jsonl":
+        return JsonlStore(jsonl_file, legacy_file=legacy_file)
+    if storage == "sqlite":
+        # 首次使用时从已有的 JSON Lines 或旧版 JSON 文件迁移
+        if jsonl_file.exists():
+            legacy_store = JsonlStore(jsonl_file)
+        elif legacy_file.exists():
+            legacy_store = JsonArrayStore(legacy_file)
+        else:
+            legacy_store = None
+        return SqliteStore(base_path / "conversation_data.db", legacy_store=legacy_store)
+    raise ValueError(f"未知的存储类型: {storage}")
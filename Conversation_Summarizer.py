@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对话自动总结引擎
+按可配置的关键词表，一次分句、一次匹配，同时得到关键要点、标签和后续行动
+"""
+
+import re
+import json
+from bisect import bisect_right
+from pathlib import Path
+
+# 默认关键词表（SmartConversationManager 使用）
+# tags 中每条规则：question / answer 中出现任一关键词即打上该标签，标签按表中顺序输出
+DEFAULT_RULES = {
+    "key_point_words": ['关键', '要点', '重要', '主要', '核心', '总结', '自动'],
+    "follow_up_words": ['需要', '应该', '建议', '可以', '下一步', '创建', '运行'],
+    "tags": [
+        {"tag": "数据分析", "question": ['数据', '分析']},
+        {"tag": "系统建立", "question": ['系统', '创建']},
+        {"tag": "对话管理", "question": ['对话', '记录']},
+        {"tag": "编程", "question": ['Python', '脚本']},
+        {"tag": "自动化", "question": ['自动化']},
+        {"tag": "内容总结", "question": ['总结', '要点']},
+        {"tag": "文件管理", "answer": ['文件']},
+        {"tag": "搜索功能", "answer": ['搜索']},
+        {"tag": "智能功能", "answer": ['智能']},
+    ],
+    "max_key_points": 5,
+    "max_follow_up": 3,
+    # 没有句子命中关键要点时，取前几句作为要点
+    "fallback_key_points": 3,
+}
+
+
+def load_rules(file_path):
+    """从 JSON 文件读取关键词表，未给出的项使用默认值"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        rules = json.load(f)
+    return {**DEFAULT_RULES, **rules}
+
+
+class Summarizer:
+    """
+    关键词匹配总结器
+
+    所有关键词编译成一个正则（长词优先的多选结构），整段回答只扫描一次：
+    每次命中后从命中位置的下一个字符继续查找，因此相互重叠的关键词都能找到；
+    同一位置只返回最长的关键词，较短的前缀关键词通过"前缀闭包"补上。
+    结果与逐个 `in` 判断完全一致。
+    """
+
+    def __init__(self, rules=None):
+        if isinstance(rules, (str, Path)):
+            rules = load_rules(rules)
+        self.rules = rules = {**DEFAULT_RULES, **(rules or {})}
+        self.tags = [rule["tag"] for rule in rules["tags"]]
+
+        # 关键词 -> 命中的类别
+        categories = {}
+        for word in rules["key_point_words"]:
+            categories.setdefault(word, set()).add(("key_point",))
+        for word in rules["follow_up_words"]:
+            categories.setdefault(word, set()).add(("follow_up",))
+        for rule in rules["tags"]:
+            for source in ("question", "answer"):
+                for word in rule.get(source, []):
+                    categories.setdefault(word, set()).add(("tag", source, rule["tag"]))
+        categories.pop('', None)
+
+        # 匹配到的最长关键词同时意味着它的所有前缀关键词也出现了
+        self._hits = {
+            word: frozenset().union(*(categories[prefix] for prefix in categories if word.startswith(prefix)))
+            for word in categories
+        }
+        words = sorted(categories, key=len, reverse=True)
+        self._pattern = re.compile('|'.join(map(re.escape, words))) if words else None
+        self._answer_tags = frozenset(("tag", "answer", rule["tag"]) for rule in rules["tags"] if rule.get("answer"))
+        # 句子已同时命中要点和行动后，其余部分只需查找回答标签的关键词
+        tag_words = sorted((word for word in categories if self._hits[word] & self._answer_tags), key=len, reverse=True)
+        self._tag_pattern = re.compile('|'.join(map(re.escape, tag_words))) if tag_words else None
+
+    def scan(self, text):
+        """依次返回文本中每个关键词命中的 (位置, 类别集合)"""
+        if self._pattern is None or not text:
+            return
+        search = self._pattern.search
+        m = search(text)
+        while m:
+            yield m.start(), self._hits[m.group()]
+            m = search(text, m.start() + 1)
+
+    def match(self, text):
+        """返回文本命中的所有类别"""
+        return frozenset().union(*(hits for _, hits in self.scan(text)))
+
+    def _find_tags(self, text, start, end, pending_tags, answer_hits):
+        """在 text[start:end] 中查找尚未出现的回答标签关键词"""
+        while pending_tags and self._tag_pattern is not None:
+            m = self._tag_pattern.search(text, start, end)
+            if not m:
+                break
+            pending_tags -= self._hits[m.group()]
+            answer_hits |= self._hits[m.group()]
+            start = m.start() + 1
+
+    def summarize(self, question, answer):
+        """一次分句、一次匹配，返回关键要点、标签和后续行动"""
+        rules = self.rules
+        sentences = answer.split('。')
+
+        # 整段回答扫描一次，按句子起始位置把命中归到各个句子
+        starts = []
+        offset = 0
+        for sentence in sentences:
+            starts.append(offset)
+            offset += len(sentence) + 1
+        starts.append(offset)
+
+        key_points, follow_up = [], []
+        answer_hits = set()
+        pending_tags = set(self._answer_tags)
+        search = self._pattern.search if self._pattern is not None else None
+        m = search(answer) if search and answer else None
+        while m:
+            i = bisect_right(starts, m.start()) - 1
+            end = starts[i + 1]
+            hits = set()
+            while m and m.start() < end:
+                hits |= self._hits[m.group()]
+                pending_tags -= hits
+                if ("key_point",) in hits and ("follow_up",) in hits:
+                    # 本句已同时命中要点和行动：句子剩余部分只查找尚未出现的回答标签
+                    self._find_tags(answer, m.start() + 1, end, pending_tags, answer_hits)
+                    m = search(answer, end)
+                else:
+                    m = search(answer, m.start() + 1)
+            answer_hits |= hits
+            if ("key_point",) in hits:
+                key_points.append(sentences[i].strip())
+            if ("follow_up",) in hits:
+                follow_up.append(sentences[i].strip())
+            # 要点和行动都已取满时，剩余文本只查找回答标签
+            if len(key_points) >= rules["max_key_points"] and len(follow_up) >= rules["max_follow_up"]:
+                self._find_tags(answer, end, len(answer), pending_tags, answer_hits)
+                break
+
+        # 如果没有找到，则提取前几个完整句子
+        if not key_points:
+            key_points = [s.strip() for s in sentences[:rules["fallback_key_points"]] if s.strip()]
+
+        question_hits = self.match(question)
+        tags = [tag for tag in dict.fromkeys(self.tags)
+                if ("tag", "question", tag) in question_hits or ("tag", "answer", tag) in answer_hits]
+
+        return {
+            "key_points": key_points[:rules["max_key_points"]],
+            "tags": tags,
+            "follow_up": follow_up[:rules["max_follow_up"]]
+        }
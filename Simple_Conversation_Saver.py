@@ -8,6 +8,8 @@
 import datetime
 from pathlib import Path
 
+from Conversation_Log import MarkdownLogWriter
+
 def simple_save():
     """简化保存"""
     print("�� 简化对话保存器")
@@ -20,12 +22,6 @@ def simple_save():
     
     log_file = Path("C:/Users/wyx33/Desktop/AI_Conversation_Log.md")
     
-    if not log_file.exists():
-        create_initial_log(log_file)
-    
-    with open(log_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
     new_entry = f"""
 ### {timestamp} - 完整对话
 **对话内容**:
@@ -34,13 +30,8 @@ def simple_save():
 ---
 """
     
-    if "## 对话记录" in content:
-        content = content.replace("## 📝 对话记录", f"## 对话记录{new_entry}")
-    else:
-        content += new_entry
-    
-    with open(log_file, 'w', encoding='utf-8') as f:
-        f.write(content)
+    # 增量写入：只改写页脚和统计字段
+    MarkdownLogWriter(log_file, lambda: create_initial_log(log_file)).append(new_entry)
     
     print("✅ 对话已保存！")
 
@@ -6,89 +6,60 @@
 """
 
 import os
+import sys
+import csv
 import json
+import time
+import argparse
 import datetime
 from pathlib import Path
 
+from Conversation_Archive import ConversationArchive
+from Conversation_Log import MarkdownLogWriter
+from Conversation_Store import DEFAULT_STORAGE, open_store, conversation_text, normalize_since
+from Conversation_Summarizer import Summarizer
+
+# 子进程中使用的总结器，由进程池初始化函数按主进程的关键词表创建
+_worker_summarizer = None
+
+def _init_summary_worker(rules):
+    global _worker_summarizer
+    _worker_summarizer = Summarizer(rules)
+
+def _summarize_batch(pairs):
+    """在子进程中总结一批 (问题, 回答)"""
+    return [_worker_summarizer.summarize(question, answer) for question, answer in pairs]
+
 class SmartConversationManager:
-    def __init__(self, base_path="C:/Users/wyx33/Desktop"):
+    def __init__(self, base_path="C:/Users/wyx33/Desktop", storage=None, summary_rules=None):
         self.base_path = Path(base_path)
         self.log_file = self.base_path / "AI_Conversation_Log.md"
         self.data_file = self.base_path / "conversation_data.json"
+        # 默认使用追加写入的 JSON Lines 存储（见 Conversation_Store.DEFAULT_STORAGE），首次使用时自动迁移旧版 JSON 文件；
+        # 自动保存器也通过 open_store() 写入同一个后端
+        self.store = open_store(self.base_path, storage)
+        # 较早的对话由 compact() 移入压缩归档，热存储只保留最近的对话
+        self.archive = ConversationArchive(self.base_path / "conversation_archive")
+        # 日志增量写入：只改写页脚和统计字段，不随日志增长而变慢
+        self.log_writer = MarkdownLogWriter(self.log_file, self.create_initial_log)
+        # 关键词表可以是字典或 JSON 文件路径，默认使用 Conversation_Summarizer.DEFAULT_RULES
+        self.summarizer = Summarizer(summary_rules)
         
     def auto_summarize(self, question, answer):
-        """自动总结对话内容"""
-        # 自动提取关键要点
-        key_points = self.extract_key_points(answer)
-        
-        # 自动生成标签
-        tags = self.generate_tags(question, answer)
-        
-        # 自动识别后续行动
-        follow_up = self.identify_follow_up(answer)
-        
-        return {
-            "key_points": key_points,
-            "tags": tags,
-            "follow_up": follow_up
-        }
+        """自动总结对话内容：关键要点、标签和后续行动一次匹配得到"""
+        return self.summarizer.summarize(question, answer)
     
     def extract_key_points(self, answer):
         """从回答中提取关键要点"""
-        key_phrases = []
-        
-        # 查找包含关键词的句子
-        sentences = answer.split('。')
-        for sentence in sentences:
-            if any(word in sentence for word in ['关键', '要点', '重要', '主要', '核心', '总结', '自动']):
-                key_phrases.append(sentence.strip())
-        
-        # 如果没有找到，则提取前3个完整句子
-        if not key_phrases:
-            key_phrases = [s.strip() for s in sentences[:3] if s.strip()]
-        
-        return key_phrases[:5]
+        return self.summarizer.summarize("", answer)["key_points"]
     
     def generate_tags(self, question, answer):
         """自动生成标签"""
-        tags = []
-        
-        # 基于问题内容生成标签
-        if '数据' in question or '分析' in question:
-            tags.append('数据分析')
-        if '系统' in question or '创建' in question:
-            tags.append('系统建立')
-        if '对话' in question or '记录' in question:
-            tags.append('对话管理')
-        if 'Python' in question or '脚本' in question:
-            tags.append('编程')
-        if '自动化' in question:
-            tags.append('自动化')
-        if '总结' in question or '要点' in question:
-            tags.append('内容总结')
-        
-        # 基于回答内容生成标签
-        if '文件' in answer:
-            tags.append('文件管理')
-        if '搜索' in answer:
-            tags.append('搜索功能')
-        if '智能' in answer:
-            tags.append('智能功能')
-        
-        # 去重并返回
-        return list(set(tags))
+        return self.summarizer.summarize(question, answer)["tags"]
     
     def identify_follow_up(self, answer):
         """识别后续行动"""
-        follow_up = []
-        
-        # 查找包含行动词汇的句子
-        sentences = answer.split('。')
-        for sentence in sentences:
-            if any(word in sentence for word in ['需要', '应该', '建议', '可以', '下一步', '创建', '运行']):
-                follow_up.append(sentence.strip())
-        
-        return follow_up[:3]
+        return self.summarizer.summarize("", answer)["follow_up"]
     
     def add_conversation_smart(self, question, answer):
         """智能添加对话记录"""
@@ -103,14 +74,11 @@ class SmartConversationManager:
             "answer": answer,
             "key_points": summary["key_points"],
             "tags": summary["tags"],
-            "follow_up": summary["follow_up"],
-            "id": len(self.get_conversations()) + 1
+            "follow_up": summary["follow_up"]
         }
         
-        # 保存到JSON文件
-        conversations = self.get_conversations()
-        conversations.append(conversation)
-        self.save_conversations(conversations)
+        # 追加保存（由存储后端分配 id）
+        self.store.append(conversation)
         
         # 更新Markdown文件
         self.update_markdown_log(conversation)
@@ -122,29 +90,191 @@ class SmartConversationManager:
         
         return conversation
     
-    def get_conversations(self):
-        """获取所有对话记录"""
-        if self.data_file.exists():
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return []
+    def add_conversations_bulk(self, records):
+        """
+        批量导入对话记录
+        
+        records 为包含 question、answer（可选 timestamp）的字典序列，可以是生成器；
+        逐条自动总结后，存储只写入一次，Markdown 日志也只更新一次。
+        """
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+        conversations = []
+        for record in records:
+            question = record.get("question") or ""
+            answer = record.get("answer") or ""
+            summary = self.auto_summarize(question, answer)
+            conversations.append({
+                "timestamp": record.get("timestamp") or now,
+                "question": question,
+                "answer": answer,
+                "key_points": summary["key_points"],
+                "tags": summary["tags"],
+                "follow_up": summary["follow_up"]
+            })
+        
+        if conversations:
+            self.store.append_many(conversations)
+            self.log_writer.append_many(self.format_log_entry(c) for c in conversations)
+        
+        print(f"✅ 已批量导入 {len(conversations)} 条对话记录！")
+        return conversations
+    
+    def resummarize_all(self, workers=None, chunk_size=2000, include_archive=True):
+        """
+        用当前关键词表重新总结所有对话
+        
+        对话按 chunk_size 分批，workers 大于 1 时分发到进程池并行处理（默认使用全部 CPU 核心）；
+        全部完成后才一次性写回存储，中途出错时原有数据不受影响。
+        写回时在存储锁（SQLite 为一个写事务）内按 id 只更新关键要点、标签和后续行动，
+        总结期间其他程序新增的对话不会被覆盖或删除。
+        include_archive 为 True 时已归档的对话一并重新总结，含有这些对话的归档分段整体重写，
+        归档搜索按新标签过滤；写回期间持有归档锁，对话不会在热存储和归档之间移动。
+        """
+        workers = workers or os.cpu_count() or 1
+        conversations = self.get_conversations(include_archive=include_archive)
+        # 旧版记录只有 conversation 字段，没有可总结的问题和回答，保持不变
+        targets = [c for c in conversations if "question" in c and "answer" in c]
+        pairs = [(c["question"], c["answer"]) for c in targets]
+        batches = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+        total = len(pairs)
+        print(f"🔄 开始重新总结 {total} 条对话（{workers} 个进程，每批 {chunk_size} 条）")
+        
+        start = time.perf_counter()
+        done = 0
+        pool = None
+        if workers > 1 and len(batches) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            
+            pool = ProcessPoolExecutor(max_workers=min(workers, len(batches)),
+                                       initializer=_init_summary_worker, initargs=(self.summarizer.rules,))
+            results = pool.map(_summarize_batch, batches)
+        else:
+            results = ([self.summarizer.summarize(q, a) for q, a in batch] for batch in batches)
+        
+        updates = {}
+        try:
+            for summaries in results:
+                for conversation, summary in zip(targets[done:done + len(summaries)], summaries):
+                    updates[conversation["id"]] = summary
+                done += len(summaries)
+                elapsed = time.perf_counter() - start
+                print(f"\r   进度: {done}/{total} ({done / total:.0%})，{done / elapsed:,.0f} 条/秒",
+                      end="", flush=True)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        if total:
+            print()
+        
+        # 一次性按 id 写回：JSON Lines / JSON 在锁内重新读取后原子替换，SQLite 在一个事务中完成；
+        # 同一条对话只会在热存储或归档之一中，两边都按 id 更新
+        with self.archive.lock:
+            self.store.update_many(updates)
+            if include_archive:
+                self.archive.update_many(updates)
+        
+        elapsed = time.perf_counter() - start
+        print(f"✅ 已重新总结 {total} 条对话，用时 {elapsed:.1f} 秒")
+        return total
+    
+    def get_conversations(self, include_archive=False):
+        """获取所有对话记录（默认只读热存储，include_archive 为 True 时包括已归档的对话）"""
+        if include_archive:
+            return list(self.archive.iter_conversations()) + self.store.load_all()
+        return self.store.load_all()
+    
+    def iter_conversations(self, since=None, tags=None, limit=None, offset=0, newest_first=False):
+        """
+        按条件逐条读取对话记录，只解码实际返回的记录
+        
+        例如最近 20 条: iter_conversations(limit=20, newest_first=True)；
+        本周的编程对话: iter_conversations(since=本周一, tags=["编程"])
+        """
+        return self.store.iter_conversations(since=since, tags=tags, limit=limit, offset=offset,
+                                             newest_first=newest_first)
     
     def save_conversations(self, conversations):
-        """保存对话记录到JSON文件"""
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(conversations, f, ensure_ascii=False, indent=2)
+        """覆盖保存所有对话记录"""
+        self.store.replace_all(conversations)
     
-    def update_markdown_log(self, conversation):
-        """更新Markdown日志文件"""
-        if not self.log_file.exists():
-            self.create_initial_log()
+    def search(self, query="", tags=None, since=None, limit=20):
+        """搜索对话记录：SQLite 存储使用全文索引，其他存储逐条扫描；热存储不足 limit 条时继续搜索归档"""
+        if hasattr(self.store, "search"):
+            hits = self.store.search(query, tags=tags, since=since, limit=limit)
+        else:
+            since = normalize_since(since)
+            terms = query.split()
+            hits = []
+            for conversation in self.iter_conversations(since=since, tags=tags):
+                text = conversation_text(conversation)
+                if all(term in text for term in terms):
+                    hits.append(conversation)
+            hits.sort(key=lambda c: (c["timestamp"], c["id"]), reverse=True)
+            hits = hits[:limit]
+        
+        if len(hits) < limit:
+            hits += self.archive.search(query, tags=tags, since=since, limit=limit - len(hits))
+        return hits
+    
+    def get_conversation(self, conversation_id):
+        """按 id 读取一条对话：先查热存储，已归档的从归档中读取"""
+        if conversation_id <= self.archive.archived_through():
+            return self.archive.get(conversation_id)
+        for conversation in self.iter_conversations(newest_first=True):
+            if conversation["id"] == conversation_id:
+                return conversation
+        return None
+    
+    def compact(self, keep_recent=1000, older_than_days=None):
+        """
+        把较早的对话移入压缩归档
         
-        # 读取现有内容
-        with open(self.log_file, 'r', encoding='utf-8') as f:
-            content = f.read()
+        热存储保留最近 keep_recent 条（至少 1 条，保证新 id 继续递增）；
+        给定 older_than_days 时只归档早于该天数的对话。
+        先写归档分段和目录，再从热存储删除已归档的记录；中途中断时下次压缩会继续完成删除。
+        SQLite 存储删除后执行 VACUUM 回收空间，数据库文件随之变小。
+        """
+        with self.archive.lock:
+            # 上次压缩写完归档后中断，热存储中可能还留有已归档的记录
+            self.store.remove_through(self.archive.archived_through())
+            
+            before = self._hot_size()
+            conversations = sorted(self.iter_conversations(), key=lambda c: c["id"])
+            old = conversations[:max(0, len(conversations) - max(1, keep_recent))]
+            if older_than_days is not None:
+                cutoff = (datetime.datetime.now() - datetime.timedelta(days=older_than_days)).strftime("%Y-%m-%d %H:%M")
+                # 只归档从最早开始连续早于截止时间的部分，保证归档按 id 连续
+                n = 0
+                while n < len(old) and old[n].get("timestamp", "") < cutoff:
+                    n += 1
+                old = old[:n]
+            if not old:
+                print("ℹ️ 没有需要归档的对话")
+                return 0
+            
+            segment = self.archive.add_segment(old)
+            self.store.remove_through(segment["last_id"])
         
-        # 添加新对话
-        new_entry = f"""
+        after = self._hot_size()
+        print(f"📦 已归档 {len(old)} 条对话（id {segment['first_id']}-{segment['last_id']}）")
+        print(f"   热存储: {before / 1024:,.0f} KB -> {after / 1024:,.0f} KB，"
+              f"新分段: {segment['size'] / 1024:,.0f} KB（{segment['codec']}）")
+        return len(old)
+    
+    def _hot_size(self):
+        """热存储数据文件的大小（SQLite 包括尚未写回主库的 WAL 文件）"""
+        path = getattr(self.store, "data_file", None) or self.store.db_file
+        paths = [path, path.with_name(path.name + "-wal")]
+        return sum(p.stat().st_size for p in paths if p.exists())
+    
+    def update_markdown_log(self, conversation):
+        """更新Markdown日志文件"""
+        # 插入到对话记录部分末尾
+        self.log_writer.append(self.format_log_entry(conversation))
+    
+    def format_log_entry(self, conversation):
+        """生成一条对话的Markdown条目"""
+        return f"""
 ### {conversation['timestamp']} - {conversation['tags'][0] if conversation['tags'] else '新对话'}
 **问题**: {conversation['question']}
 
@@ -160,16 +290,6 @@ class SmartConversationManager:
 
 ---
 """
-        
-        # 在对话记录部分插入新内容
-        if "## �� 对话记录" in content:
-            content = content.replace("## 📝 对话记录", f"## �� 对话记录{new_entry}")
-        else:
-            content += new_entry
-        
-        # 写回文件
-        with open(self.log_file, 'w', encoding='utf-8') as f:
-            f.write(content)
     
     def create_initial_log(self):
         """创建初始日志文件"""
@@ -193,6 +313,7 @@ class SmartConversationManager:
 - 按日期: `Ctrl+F` 搜索日期
 - 按话题: `Ctrl+F` 搜索标签
 - 按关键词: `Ctrl+F` 搜索内容
+- 全文检索: `SmartConversationManager(storage="sqlite").search("关键词", tags=[...], since="2024-01-01")`
 
 ---
 
@@ -201,9 +322,49 @@ class SmartConversationManager:
         with open(self.log_file, 'w', encoding='utf-8') as f:
             f.write(initial_content)
 
-# 使用示例
-if __name__ == "__main__":
-    manager = SmartConversationManager()
+# 读取批量导入文件
+def read_conversations(file_path, file_format=None):
+    """逐条读取导出的对话记录（JSONL 或 CSV，CSV 需包含 question、answer 列）"""
+    file_path = Path(file_path)
+    file_format = file_format or ("csv" if file_path.suffix.lower() == ".csv" else "jsonl")
+    with open(file_path, 'r', encoding='utf-8-sig', newline='') as f:
+        if file_format == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+# 命令行入口：默认运行使用示例，--import 批量导入，--resummarize 重新总结，--compact 归档
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='智能AI对话记录管理系统')
+    parser.add_argument('--import', dest='import_file', help='批量导入对话记录文件（JSONL 或 CSV）')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help='导入文件格式（默认按扩展名判断）')
+    parser.add_argument('--base-path', default="C:/Users/wyx33/Desktop", help='对话记录保存目录')
+    parser.add_argument('--storage', default=DEFAULT_STORAGE, choices=['jsonl', 'sqlite', 'json'], help='存储后端')
+    parser.add_argument('--rules', help='自动总结使用的关键词表（JSON 文件）')
+    parser.add_argument('--resummarize', action='store_true', help='用当前关键词表重新总结所有已保存的对话')
+    parser.add_argument('--jobs', type=int, default=None, help='重新总结使用的进程数（默认为 CPU 核心数）')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='重新总结时每批的对话数')
+    parser.add_argument('--compact', action='store_true', help='把较早的对话移入压缩归档')
+    parser.add_argument('--keep-recent', type=int, default=1000, help='压缩时热存储保留的最近对话数')
+    parser.add_argument('--older-than-days', type=int, help='压缩时只归档早于该天数的对话')
+    args = parser.parse_args(argv)
+    
+    manager = SmartConversationManager(args.base_path, storage=args.storage, summary_rules=args.rules)
+    
+    if args.import_file:
+        manager.add_conversations_bulk(read_conversations(args.import_file, args.format))
+        print("📁 请查看 AI_Conversation_Log.md 文件")
+        return 0
+    
+    if args.resummarize:
+        manager.resummarize_all(workers=args.jobs, chunk_size=args.chunk_size)
+        return 0
+    
+    if args.compact:
+        manager.compact(keep_recent=args.keep_recent, older_than_days=args.older_than_days)
+        return 0
     
     # 只需要提供问题和回答，系统自动总结！
     manager.add_conversation_smart(
@@ -212,4 +373,8 @@ if __name__ == "__main__":
     )
     
     print("\n🎉 智能总结完成！")
-    print("📁 请查看 AI_Conversation_Log.md 文件")
\ No newline at end of file
+    print("📁 请查看 AI_Conversation_Log.md 文件")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
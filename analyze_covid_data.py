@@ -1,149 +1,233 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import datetime
+import argparse
+import os
+import sys
 
-# 设置中文字体支持
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS', 'DejaVu Sans']
-plt.rcParams['axes.unicode_minus'] = False
+from covid_core import open_analysis, release_analysis
 
-try:
-    # 读取CSV文件
-    df = pd.read_csv('UM_C19_2021.csv')
-    
-    print("=== COVID-19 检测数据分析报告 ===")
-    print(f"文件名称: UM_C19_2021.csv")
-    print(f"总行数: {len(df)}")
-    print(f"总列数: {len(df.columns)}")
-    
-    print("\n=== 列名信息 ===")
-    for i, col in enumerate(df.columns, 1):
-        print(f"{i}. {col}")
-    
-    print("\n=== 前10行数据预览 ===")
-    print(df.head(10).to_string())
-    
-    print("\n=== 数据类型 ===")
-    print(df.dtypes)
-    
-    # 转换日期格式
-    df['Date'] = pd.to_datetime(df['Date'])
-    
-    print("\n=== 时间范围 ===")
-    print(f"开始日期: {df['Date'].min()}")
-    print(f"结束日期: {df['Date'].max()}")
-    print(f"数据跨度: {(df['Date'].max() - df['Date'].min()).days} 天")
-    
-    print("\n=== 人员类型统计 ===")
-    print(df['Type'].value_counts())
-    
-    print("\n=== 居住类型统计 ===")
-    print(df['residence'].value_counts())
-    
-    print("\n=== 基本统计信息 ===")
-    print("阳性检测统计:")
-    print(f"总阳性数: {df['Positive'].sum()}")
-    print(f"平均每日阳性数: {df['Positive'].mean():.2f}")
-    print(f"最大单日阳性数: {df['Positive'].max()}")
-    
-    print("\n阴性检测统计:")
-    print(f"总阴性数: {df['Negative'].sum()}")
-    print(f"平均每日阴性数: {df['Negative'].mean():.2f}")
-    print(f"最大单日阴性数: {df['Negative'].max()}")
-    
-    print("\n=== 阳性率分析 ===")
-    df['Total_Tests'] = df['Positive'] + df['Negative']
-    df['Positive_Rate'] = (df['Positive'] / df['Total_Tests'] * 100).round(2)
-    
-    print(f"总体阳性率: {(df['Positive'].sum() / df['Total_Tests'].sum() * 100):.2f}%")
-    print(f"平均阳性率: {df['Positive_Rate'].mean():.2f}%")
-    print(f"最高阳性率: {df['Positive_Rate'].max():.2f}%")
-    
-    print("\n=== 按人员类型分析 ===")
-    type_analysis = df.groupby('Type').agg({
-        'Positive': 'sum',
-        'Negative': 'sum',
-        'Total_Tests': 'sum'
-    }).reset_index()
-    type_analysis['Positive_Rate'] = (type_analysis['Positive'] / type_analysis['Total_Tests'] * 100).round(2)
-    print(type_analysis)
-    
-    print("\n=== 按居住类型分析 ===")
-    residence_analysis = df.groupby('residence').agg({
-        'Positive': 'sum',
-        'Negative': 'sum',
-        'Total_Tests': 'sum'
-    }).reset_index()
-    residence_analysis['Positive_Rate'] = (residence_analysis['Positive'] / residence_analysis['Total_Tests'] * 100).round(2)
-    print(residence_analysis)
-    
-    print("\n=== 缺失值统计 ===")
-    missing_data = df.isnull().sum()
-    if missing_data.sum() > 0:
-        print(missing_data[missing_data > 0])
-    else:
-        print("没有缺失值")
-    
-    print("\n=== 重复行统计 ===")
-    duplicates = df.duplicated().sum()
-    print(f"重复行数量: {duplicates}")
-    
-    # 创建可视化图表
-    print("\n=== 生成可视化图表 ===")
-    
-    # 1. 每日阳性数趋势
-    daily_positive = df.groupby('Date')['Positive'].sum().reset_index()
-    
-    plt.figure(figsize=(15, 10))
-    
-    plt.subplot(2, 2, 1)
-    plt.plot(daily_positive['Date'], daily_positive['Positive'], linewidth=2, color='red')
-    plt.title('每日阳性检测数趋势', fontsize=14, fontweight='bold')
-    plt.xlabel('日期')
-    plt.ylabel('阳性数')
-    plt.xticks(rotation=45)
-    plt.grid(True, alpha=0.3)
-    
-    # 2. 按人员类型的阳性数对比
-    plt.subplot(2, 2, 2)
-    type_positive = df.groupby('Type')['Positive'].sum()
-    plt.pie(type_positive.values, labels=type_positive.index, autopct='%1.1f%%', startangle=90)
-    plt.title('按人员类型的阳性数分布', fontsize=14, fontweight='bold')
-    
-    # 3. 按居住类型的阳性率对比
-    plt.subplot(2, 2, 3)
-    residence_positive_rate = residence_analysis.set_index('residence')['Positive_Rate']
-    plt.bar(range(len(residence_positive_rate)), residence_positive_rate.values, color='orange')
-    plt.title('按居住类型的阳性率对比', fontsize=14, fontweight='bold')
-    plt.xlabel('居住类型')
-    plt.ylabel('阳性率 (%)')
-    plt.xticks(range(len(residence_positive_rate)), residence_positive_rate.index, rotation=45)
-    
-    # 4. 月度阳性数统计
-    plt.subplot(2, 2, 4)
-    df['Month'] = df['Date'].dt.to_period('M')
-    monthly_positive = df.groupby('Month')['Positive'].sum()
-    plt.bar(range(len(monthly_positive)), monthly_positive.values, color='green')
-    plt.title('月度阳性数统计', fontsize=14, fontweight='bold')
-    plt.xlabel('月份')
-    plt.ylabel('阳性数')
-    plt.xticks(range(len(monthly_positive)), [str(x) for x in monthly_positive.index], rotation=45)
-    
-    plt.tight_layout()
-    plt.savefig('covid_analysis.png', dpi=300, bbox_inches='tight')
-    print("图表已保存为 'covid_analysis.png'")
-    
-    # 显示图表
-    plt.show()
-    
-    print("\n=== 关键发现 ===")
-    print("1. 数据时间跨度:", f"{(df['Date'].max() - df['Date'].min()).days} 天")
-    print("2. 总检测数:", f"{df['Total_Tests'].sum():,}")
-    print("3. 总阳性数:", f"{df['Positive'].sum():,}")
-    print("4. 总体阳性率:", f"{(df['Positive'].sum() / df['Total_Tests'].sum() * 100):.2f}%")
-    print("5. 阳性率最高的人群类型:", residence_analysis.loc[residence_analysis['Positive_Rate'].idxmax(), 'residence'])
-    print("6. 阳性率最高的人员类型:", type_analysis.loc[type_analysis['Positive_Rate'].idxmax(), 'Type'])
-    
-except Exception as e:
-    print(f"分析过程中出错: {e}")
-    import traceback
-    traceback.print_exc()
+# 导入绘图库：只有生成图表章节时才需要，--help 和只输出统计章节时不必付出导入 matplotlib 的时间
+def load_pyplot():
+    # 批量运行时使用非交互的 Agg 后端，必须在导入 pyplot 之前设置
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    
+    # 设置中文字体支持
+    plt.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS', 'DejaVu Sans']
+    plt.rcParams['axes.unicode_minus'] = False
+    return plt
+
+# 报告章节（按输出顺序）
+REPORT_SECTIONS = ['overview', 'counts', 'rate', 'type', 'residence', 'quality', 'chart', 'findings']
+
+# 各报告章节依赖的汇总统计表
+SECTION_STATS = {
+    'type': ['type'],
+    'residence': ['residence'],
+    'chart': ['type', 'residence', 'daily', 'year_month'],
+    'findings': ['type', 'residence'],
+}
+
+def report(file_path, sections=REPORT_SECTIONS, chart_path='covid_analysis.png'):
+    # 读取、预处理和汇总都由共享的分析流水线完成，
+    # 与 covid_data_analysis.py 在同一进程中运行时直接复用其结果
+    analysis = open_analysis(file_path)
+    df = analysis.raw
+    if df is None:
+        return False
+    data = analysis.data
+    needed = sorted({name for section in sections for name in SECTION_STATS.get(section, [])})
+    stats = analysis.run(needed)
+    
+    if 'overview' in sections:
+        print("=== COVID-19 检测数据分析报告 ===")
+        print(f"文件名称: {file_path}")
+        print(f"总行数: {len(df)}")
+        print(f"总列数: {len(df.columns)}")
+        
+        print("\n=== 列名信息 ===")
+        for i, col in enumerate(df.columns, 1):
+            print(f"{i}. {col}")
+        
+        print("\n=== 前10行数据预览 ===")
+        print(df.head(10).to_string())
+        
+        print("\n=== 数据类型 ===")
+        print(df.dtypes)
+        
+        print("\n=== 时间范围 ===")
+        print(f"开始日期: {data['Date'].min()}")
+        print(f"结束日期: {data['Date'].max()}")
+        print(f"数据跨度: {(data['Date'].max() - data['Date'].min()).days} 天")
+        
+        print("\n=== 人员类型统计 ===")
+        print(df['Type'].value_counts())
+        
+        print("\n=== 居住类型统计 ===")
+        print(df['residence'].value_counts())
+    
+    if 'counts' in sections:
+        print("\n=== 基本统计信息 ===")
+        print("阳性检测统计:")
+        print(f"总阳性数: {df['Positive'].sum()}")
+        print(f"平均每日阳性数: {df['Positive'].mean():.2f}")
+        print(f"最大单日阳性数: {df['Positive'].max()}")
+        
+        print("\n阴性检测统计:")
+        print(f"总阴性数: {df['Negative'].sum()}")
+        print(f"平均每日阴性数: {df['Negative'].mean():.2f}")
+        print(f"最大单日阴性数: {df['Negative'].max()}")
+    
+    # 逐行阳性率保留除以0产生的缺失值，不计入平均值
+    row_rate = (data['Positive'] / data['Total_Tests'] * 100).round(2)
+    
+    if 'rate' in sections:
+        print("\n=== 阳性率分析 ===")
+        print(f"总体阳性率: {(data['Positive'].sum() / data['Total_Tests'].sum() * 100):.2f}%")
+        print(f"平均阳性率: {row_rate.mean():.2f}%")
+        print(f"最高阳性率: {row_rate.max():.2f}%")
+    
+    type_analysis = stats.get('type')
+    if type_analysis is not None:
+        type_analysis['Positive_Rate'] = type_analysis['Positive_Rate'].round(2)
+    residence_analysis = stats.get('residence')
+    if residence_analysis is not None:
+        residence_analysis['Positive_Rate'] = residence_analysis['Positive_Rate'].round(2)
+    
+    if 'type' in sections:
+        print("\n=== 按人员类型分析 ===")
+        print(type_analysis)
+    
+    if 'residence' in sections:
+        print("\n=== 按居住类型分析 ===")
+        print(residence_analysis)
+    
+    if 'quality' in sections:
+        print("\n=== 缺失值统计 ===")
+        missing_data = df.isnull().sum()
+        missing_data['Total_Tests'] = data['Total_Tests'].isnull().sum()
+        missing_data['Positive_Rate'] = row_rate.isnull().sum()
+        if missing_data.sum() > 0:
+            print(missing_data[missing_data > 0])
+        else:
+            print("没有缺失值")
+        
+        print("\n=== 重复行统计 ===")
+        duplicates = df.duplicated().sum()
+        print(f"重复行数量: {duplicates}")
+    
+    if 'chart' in sections:
+        # 创建可视化图表
+        print("\n=== 生成可视化图表 ===")
+        plt = load_pyplot()
+        
+        # 1. 每日阳性数趋势
+        daily_positive = stats['daily'][['Date', 'Positive']]
+        
+        plt.figure(figsize=(15, 10))
+        
+        plt.subplot(2, 2, 1)
+        plt.plot(daily_positive['Date'], daily_positive['Positive'], linewidth=2, color='red')
+        plt.title('每日阳性检测数趋势', fontsize=14, fontweight='bold')
+        plt.xlabel('日期')
+        plt.ylabel('阳性数')
+        plt.xticks(rotation=45)
+        plt.grid(True, alpha=0.3)
+        
+        # 2. 按人员类型的阳性数对比
+        plt.subplot(2, 2, 2)
+        type_positive = type_analysis.set_index('Type')['Positive']
+        plt.pie(type_positive.values, labels=type_positive.index, autopct='%1.1f%%', startangle=90)
+        plt.title('按人员类型的阳性数分布', fontsize=14, fontweight='bold')
+        
+        # 3. 按居住类型的阳性率对比
+        plt.subplot(2, 2, 3)
+        residence_positive_rate = residence_analysis.set_index('residence')['Positive_Rate']
+        plt.bar(range(len(residence_positive_rate)), residence_positive_rate.values, color='orange')
+        plt.title('按居住类型的阳性率对比', fontsize=14, fontweight='bold')
+        plt.xlabel('居住类型')
+        plt.ylabel('阳性率 (%)')
+        plt.xticks(range(len(residence_positive_rate)), residence_positive_rate.index, rotation=45)
+        
+        # 4. 月度阳性数统计
+        plt.subplot(2, 2, 4)
+        monthly_positive = stats['year_month'].set_index('YearMonth')['Positive']
+        plt.bar(range(len(monthly_positive)), monthly_positive.values, color='green')
+        plt.title('月度阳性数统计', fontsize=14, fontweight='bold')
+        plt.xlabel('月份')
+        plt.ylabel('阳性数')
+        plt.xticks(range(len(monthly_positive)), [str(x) for x in monthly_positive.index], rotation=45)
+        
+        plt.tight_layout()
+        plt.savefig(chart_path, dpi=300, bbox_inches='tight')
+        plt.close()
+        print(f"图表已保存为 '{chart_path}'")
+    
+    if 'findings' in sections:
+        print("\n=== 关键发现 ===")
+        print("1. 数据时间跨度:", f"{(data['Date'].max() - data['Date'].min()).days} 天")
+        print("2. 总检测数:", f"{data['Total_Tests'].sum():,}")
+        print("3. 总阳性数:", f"{data['Positive'].sum():,}")
+        print("4. 总体阳性率:", f"{(data['Positive'].sum() / data['Total_Tests'].sum() * 100):.2f}%")
+        print("5. 阳性率最高的人群类型:", residence_analysis.loc[residence_analysis['Positive_Rate'].idxmax(), 'residence'])
+        print("6. 阳性率最高的人员类型:", type_analysis.loc[type_analysis['Positive_Rate'].idxmax(), 'Type'])
+    
+    return True
+
+# 展开输入参数：目录展开为其中所有的 CSV 文件
+def collect_inputs(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.lower().endswith('.csv')))
+        else:
+            files.append(path)
+    return files
+
+# 图表输出路径：单个输入保持原文件名，多个输入时以源文件名区分
+def chart_path_for(file_path, output_dir, batch):
+    if not batch:
+        return os.path.join(output_dir, 'covid_analysis.png')
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(output_dir, f'{stem}_covid_analysis.png')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='COVID-19 检测数据分析报告（批量、无界面运行）')
+    parser.add_argument('inputs', nargs='*', default=['UM_C19_2021.csv'],
+                        help='输入 CSV 文件或包含 CSV 文件的目录，可指定多个')
+    parser.add_argument('-o', '--output-dir', default='.', help='图表输出目录')
+    parser.add_argument('-s', '--sections', default=','.join(REPORT_SECTIONS),
+                        help=f"要输出的报告章节，逗号分隔（可选: {', '.join(REPORT_SECTIONS)}）")
+    args = parser.parse_args(argv)
+    
+    sections = [section.strip() for section in args.sections.split(',') if section.strip()]
+    unknown = [section for section in sections if section not in REPORT_SECTIONS]
+    if unknown:
+        parser.error(f"未知的报告章节: {', '.join(unknown)}")
+    
+    files = collect_inputs(args.inputs)
+    if not files:
+        parser.error("没有找到输入文件")
+    os.makedirs(args.output_dir, exist_ok=True)
+    
+    # 所有文件在同一进程中处理，只需启动一次解释器和 matplotlib
+    failures = 0
+    for file_path in files:
+        try:
+            ok = report(file_path, sections, chart_path_for(file_path, args.output_dir, len(files) > 1))
+        except Exception as e:
+            print(f"分析过程中出错: {e}")
+            import traceback
+            traceback.print_exc()
+            ok = False
+        finally:
+            # 处理完一个文件就释放其数据，避免批量处理时内存持续增长
+            release_analysis(file_path)
+        failures += not ok
+    
+    if len(files) > 1:
+        print(f"\n=== 批量处理完成: 成功 {len(files) - failures} 个，失败 {failures} 个 ===")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+统计型微基准测试工具
+预热后重复测量，直到置信区间足够窄；输出中位数、四分位距和每秒操作数，
+结果可以保存为 JSON 基线，并与已保存的基线比较以发现性能回退
+"""
+
+import gc
+import io
+import sys
+import json
+import math
+import time
+import fnmatch
+import inspect
+import argparse
+import platform
+import datetime
+import statistics
+import contextlib
+
+from timer_utils import percentile
+
+# 已注册的基准测试：名称 -> 准备函数
+BENCHMARKS = {}
+
+# 基线文件格式版本
+BASELINE_VERSION = 1
+
+# 95% 置信区间的 t 分布临界值（自由度 -> 临界值），自由度更大时取正态近似
+T_CRITICAL = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306,
+              9: 2.262, 10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086, 25: 2.060, 30: 2.042}
+
+
+def benchmark(name=None):
+    """
+    注册一个基准测试
+
+    被装饰的是准备函数：完成数据准备后返回要计时的无参函数；
+    也可以写成生成器，yield 要计时的函数，之后的代码在测量结束后执行清理。
+    会修改数据的基准测试（如追加记录）返回或 yield (计时函数, 恢复函数)，
+    恢复函数在每个样本开始前、计时之外调用，把数据恢复到准备好时的状态，
+    使每个样本面对同样大小的数据，结果与测量时长无关、可以与基线比较。
+    """
+    def decorator(setup):
+        BENCHMARKS[name or setup.__name__] = setup
+        return setup
+    return decorator
+
+
+def _t_critical(df):
+    for key in sorted(T_CRITICAL):
+        if df <= key:
+            return T_CRITICAL[key]
+    return 1.96
+
+
+def _calibrate(func, min_sample_time):
+    """确定每个样本内的循环次数，使单个样本耗时不少于 min_sample_time"""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_sample_time or loops >= 1 << 24:
+            return loops
+        # 按已测耗时估计所需次数，至少翻倍
+        loops = max(loops * 2, int(loops * min_sample_time / max(elapsed, 1e-9)) + 1)
+
+
+def measure(func, warmup=1, min_runs=5, max_runs=1000, max_time=5.0, target_ci=0.02,
+            min_sample_time=0.005, reset=None):
+    """
+    测量无参函数的单次耗时
+
+    先运行 warmup 次预热并校准每个样本的循环次数，然后逐个采集样本，
+    直到 95% 置信区间半宽相对均值不超过 target_ci，或达到 max_runs / max_time 上限。
+    计时期间关闭垃圾回收，减少噪声。
+    给定 reset 时在校准后和每个样本开始前调用（不计入耗时）。
+    """
+    for _ in range(warmup):
+        func()
+    if reset is not None:
+        reset()
+    loops = _calibrate(func, min_sample_time)
+
+    samples = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    deadline = time.perf_counter() + max_time
+    try:
+        while len(samples) < max_runs:
+            if reset is not None:
+                reset()
+            start = time.perf_counter()
+            for _ in range(loops):
+                func()
+            samples.append((time.perf_counter() - start) / loops)
+            if len(samples) >= min_runs:
+                rel_ci = _relative_ci(samples)
+                if rel_ci <= target_ci or time.perf_counter() >= deadline:
+                    break
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return summarize_samples(samples, loops)
+
+
+def _relative_ci(samples):
+    mean = statistics.fmean(samples)
+    if len(samples) < 2 or mean <= 0:
+        return math.inf
+    half_width = _t_critical(len(samples) - 1) * statistics.stdev(samples) / math.sqrt(len(samples))
+    return half_width / mean
+
+
+def summarize_samples(samples, loops=1):
+    """样本统计：中位数、四分位数、均值、标准差、相对置信区间和每秒操作数（时间单位为秒）"""
+    ordered = sorted(samples)
+    median = percentile(ordered, 50)
+    q1, q3 = percentile(ordered, 25), percentile(ordered, 75)
+    return {
+        "median": median,
+        "q1": q1,
+        "q3": q3,
+        "iqr": q3 - q1,
+        "mean": statistics.fmean(ordered),
+        "stdev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        "min": ordered[0],
+        "max": ordered[-1],
+        "rel_ci": _relative_ci(ordered),
+        "runs": len(ordered),
+        "loops": loops,
+        "ops_per_sec": 1 / median if median > 0 else math.inf,
+    }
+
+
+def run_benchmark(setup, **options):
+    """运行一个已注册的基准测试（准备、测量、清理）；准备和计时期间的输出被丢弃"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        if inspect.isgeneratorfunction(setup):
+            fixture = setup()
+            try:
+                return _measure_prepared(next(fixture), **options)
+            finally:
+                # 继续执行生成器，运行 yield 之后的清理代码（close() 只会在 yield 处抛出 GeneratorExit）
+                next(fixture, None)
+                fixture.close()
+        return _measure_prepared(setup(), **options)
+
+
+def _measure_prepared(prepared, **options):
+    """准备函数的结果可以是计时函数，也可以是 (计时函数, 恢复函数)"""
+    if isinstance(prepared, tuple):
+        func, reset = prepared
+        return measure(func, reset=reset, **options)
+    return measure(prepared, **options)
+
+
+def format_time(seconds):
+    """把秒数格式化为合适的单位"""
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3f} {unit}"
+    return f"{seconds / 1e-9:.1f} ns"
+
+
+def run_suite(patterns=None, **options):
+    """运行名称匹配任一通配符模式的基准测试，返回 {名称: 统计结果}"""
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if patterns and not any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+            continue
+        result = run_benchmark(setup, **options)
+        results[name] = result
+        print(f"{name:<40} {format_time(result['median']):>12} ± {format_time(result['iqr'] / 2):>11}"
+              f"  {result['ops_per_sec']:>12,.1f} ops/s  (n={result['runs']}, loops={result['loops']},"
+              f" ci=±{result['rel_ci'] * 100:.1f}%)")
+    return results
+
+
+def save_baseline(results, file_path):
+    """把结果保存为 JSON 基线，附带运行环境信息"""
+    baseline = {
+        "version": BASELINE_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+
+
+def load_baseline(file_path):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get("version") != BASELINE_VERSION:
+        raise ValueError(f"不支持的基线格式版本: {baseline.get('version')}")
+    return baseline
+
+
+def compare(results, baseline, threshold=0.10):
+    """
+    与基线比较中位数，返回回退的基准测试名称列表
+
+    当前中位数超过基线中位数的 (1 + threshold) 倍，且两者的四分位区间不重叠时判为回退，
+    避免把测量噪声当作回退。
+    """
+    regressions = []
+    print(f"\n=== 与基线比较（{baseline.get('created', '?')}，阈值 {threshold * 100:.0f}%） ===")
+    for name, result in results.items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<40} {'（基线中没有）':>12}")
+            continue
+        ratio = result["median"] / base["median"] if base["median"] > 0 else math.inf
+        if ratio > 1 + threshold and result["q1"] > base["q3"]:
+            status = "回退"
+            regressions.append(name)
+        elif ratio < 1 - threshold and result["q3"] < base["q1"]:
+            status = "提升"
+        else:
+            status = "持平"
+        print(f"{name:<40} {format_time(base['median']):>12} -> {format_time(result['median']):>12}"
+              f"  {(ratio - 1) * 100:+7.1f}%  {status}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='统计型微基准测试')
+    parser.add_argument('patterns', nargs='*', help='只运行名称匹配这些通配符的基准测试，如 covid.*')
+    parser.add_argument('--suite', default='benchmark_suite', help='包含基准测试定义的模块')
+    parser.add_argument('--list', action='store_true', help='列出所有基准测试')
+    parser.add_argument('--save', help='把结果保存为 JSON 基线')
+    parser.add_argument('--compare', help='与该 JSON 基线比较，有回退时退出码为 1')
+    parser.add_argument('--threshold', type=float, default=0.10, help='判定回退的相对变慢阈值（默认 0.10）')
+    parser.add_argument('--target-ci', type=float, default=0.02, help='目标相对置信区间半宽（默认 0.02）')
+    parser.add_argument('--min-runs', type=int, default=5, help='最少样本数')
+    parser.add_argument('--max-runs', type=int, default=1000, help='最多样本数')
+    parser.add_argument('--max-time', type=float, default=5.0, help='每个基准测试的最长测量时间（秒）')
+    parser.add_argument('--warmup', type=int, default=1, help='预热运行次数')
+    args = parser.parse_args(argv)
+
+    __import__(args.suite)
+    if args.list:
+        for name in BENCHMARKS:
+            print(name)
+        return 0
+
+    results = run_suite(args.patterns, warmup=args.warmup, min_runs=args.min_runs,
+                        max_runs=args.max_runs, max_time=args.max_time, target_ci=args.target_ci)
+    if not results:
+        parser.error("没有匹配的基准测试")
+    if args.save:
+        save_baseline(results, args.save)
+        print(f"\n结果已保存为基线 '{args.save}'")
+    if args.compare:
+        regressions = compare(results, load_baseline(args.compare), args.threshold)
+        if regressions:
+            print(f"\n⚠️ 性能回退: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    # 基准测试模块通过 import benchmark 注册，这里也以同名模块运行，共用同一个注册表
+    sys.exit(__import__('benchmark').main())
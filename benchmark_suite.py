@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试套件
+覆盖 COVID 数据汇总路径、统计函数以及对话记录的保存和读取，
+用 python benchmark.py 运行（见 benchmark.py 的命令行参数）
+"""
+
+import shutil
+import tempfile
+import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmark import benchmark
+
+# 合成 COVID 数据的行数和天数
+COVID_ROWS = 100000
+COVID_DAYS = 365
+
+# 对话存储中预先写入的对话数
+CONVERSATIONS = 2000
+
+_SAMPLE_QUESTION = "如何用 Python 脚本自动分析对话数据？"
+_SAMPLE_ANSWER = ("可以创建一个自动化脚本。关键是先总结对话要点。建议把记录保存到文件中，"
+                  "并提供搜索功能。下一步需要运行智能分析。")
+
+
+def covid_frame(rows=COVID_ROWS, days=COVID_DAYS, seed=0):
+    """与 UM_C19_2021.csv 结构相同的合成数据（固定随机种子，每次生成的数据相同）"""
+    rng = np.random.default_rng(seed)
+    start = datetime.date(2020, 8, 16)
+    calendar = [start + datetime.timedelta(days=i) for i in range(days)]
+    dates = [f"{day.month}/{day.day}/{day.year}" for day in calendar]
+    groups = [('Faculty/Staff', 'Non-Residential'), ('Students', 'Students - Non-Residential'),
+              ('Students', 'Students - Residential')]
+    group = rng.integers(0, len(groups), rows)
+    return pd.DataFrame({
+        'Date': np.array(dates, dtype=object)[np.sort(rng.integers(0, len(dates), rows))],
+        'Type': [groups[g][0] for g in group],
+        'residence': [groups[g][1] for g in group],
+        'Positive': rng.poisson(1.5, rows),
+        'Negative': rng.poisson(40, rows),
+    })
+
+
+def _conversation(i):
+    return {"id": i + 1, "timestamp": f"2024-01-01 {i // 60 % 24:02d}:{i % 60:02d}",
+            "question": f"{_SAMPLE_QUESTION} #{i}", "answer": _SAMPLE_ANSWER,
+            "key_points": ["关键是先总结对话要点"], "tags": ["编程", "自动化"],
+            "follow_up": ["下一步需要运行智能分析"]}
+
+
+# ---- COVID 数据汇总路径 ----
+
+@benchmark("covid.load_data")
+def bench_load_data():
+    from covid_core import load_data
+    tmp_dir = tempfile.mkdtemp()
+    file_path = Path(tmp_dir) / 'covid.csv'
+    covid_frame().to_csv(file_path, index=False)
+    yield lambda: load_data(str(file_path), use_cache=False)
+    shutil.rmtree(tmp_dir)
+
+
+@benchmark("covid.preprocess_data")
+def bench_preprocess_data():
+    from covid_core import preprocess_data
+    raw = covid_frame()
+    return lambda: preprocess_data(raw.copy(deep=False))
+
+
+@benchmark("covid.aggregate")
+def bench_aggregate():
+    from covid_core import aggregate, preprocess_data
+    data = preprocess_data(covid_frame())
+    return lambda: aggregate(data, ['Type', 'residence', 'Month', 'Date'], rate=False)
+
+
+@benchmark("covid.analysis_run")
+def bench_analysis_run():
+    # 完整的共享流水线：读取（列式缓存命中）、预处理、一次扫描汇总所有章节
+    from covid_core import CovidAnalysis
+    tmp_dir = tempfile.mkdtemp()
+    file_path = str(Path(tmp_dir) / 'covid.csv')
+    covid_frame().to_csv(file_path, index=False)
+    CovidAnalysis(file_path).run(['type'])
+    yield lambda: CovidAnalysis(file_path).run(['type', 'residence', 'month', 'daily'])
+    shutil.rmtree(tmp_dir)
+
+
+# ---- 统计函数 ----
+
+@benchmark("stats.basic_statistics")
+def bench_basic_statistics():
+    from covid_core import preprocess_data
+    from covid_data_analysis import basic_statistics
+    data = preprocess_data(covid_frame())
+    return lambda: basic_statistics(data)
+
+
+@benchmark("stats.summarize")
+def bench_summarize():
+    from covid_core import aggregate, preprocess_data, summarize
+    sums = aggregate(preprocess_data(covid_frame()), ['Date'], rate=False)['Date']
+    return lambda: summarize(sums, 'Date')
+
+
+@benchmark("stats.rolling_trends")
+def bench_rolling_trends():
+    from covid_core import preprocess_data, rolling_trends
+    data = preprocess_data(covid_frame())
+    return lambda: rolling_trends(data, group='Type')
+
+
+@benchmark("stats.profiler_span")
+def bench_profiler_span():
+    # 性能分析器埋点本身的开销
+    from timer_utils import Profiler
+    profiler = Profiler()
+
+    def run():
+        with profiler.span("outer"):
+            with profiler.span("inner"):
+                pass
+    return run
+
+
+# ---- 对话记录保存和读取 ----
+
+def _restorer(work_dir, before=None, after=None):
+    """
+    把 work_dir 当前的内容复制为模板，返回恢复函数：
+    每次调用把 work_dir 恢复成模板的内容（before/after 在恢复前后调用，用于关闭和重新打开连接）
+    """
+    work_dir = Path(work_dir)
+    template = work_dir.with_name(work_dir.name + '.template')
+    shutil.copytree(work_dir, template)
+
+    def reset():
+        if before is not None:
+            before()
+        shutil.rmtree(work_dir)
+        shutil.copytree(template, work_dir)
+        if after is not None:
+            after()
+    return reset
+
+
+def _store_benchmarks(storage):
+    def fixture(action):
+        def setup():
+            from Conversation_Store import open_store
+            tmp_dir = tempfile.mkdtemp()
+            store = open_store(Path(tmp_dir), storage)
+            store.append_many([_conversation(i) for i in range(CONVERSATIONS)])
+            yield action(store)
+            if hasattr(store, "close"):
+                store.close()
+            shutil.rmtree(tmp_dir)
+        return setup
+
+    def bench_append():
+        # 追加会让存储越来越大，每个样本开始前恢复到预先写入 CONVERSATIONS 条的状态
+        from Conversation_Store import open_store
+        tmp_dir = tempfile.mkdtemp()
+        work_dir = Path(tmp_dir) / 'store'
+        work_dir.mkdir()
+        stores = [open_store(work_dir, storage)]
+        stores[0].append_many([_conversation(i) for i in range(CONVERSATIONS)])
+
+        def close():
+            if hasattr(stores[0], "close"):
+                stores[0].close()
+
+        def reopen():
+            stores[0] = open_store(work_dir, storage)
+            # 先读一条，让建立连接、读取头文件等一次性开销发生在计时之外
+            next(stores[0].iter_conversations(limit=1), None)
+
+        close()
+        reset = _restorer(work_dir, before=close, after=reopen)
+        reopen()
+        yield (lambda: stores[0].append(_conversation(0))), reset
+        close()
+        shutil.rmtree(tmp_dir)
+
+    benchmark(f"conversation.{storage}.append")(bench_append)
+    benchmark(f"conversation.{storage}.load_all")(fixture(lambda store: store.load_all))
+    benchmark(f"conversation.{storage}.latest_page")(
+        fixture(lambda store: lambda: list(store.iter_conversations(limit=20, newest_first=True))))
+
+
+for _storage in ("json", "jsonl", "sqlite"):
+    _store_benchmarks(_storage)
+
+
+@benchmark("conversation.summarize")
+def bench_conversation_summarize():
+    from Conversation_Summarizer import Summarizer
+    summarizer = Summarizer()
+    return lambda: summarizer.summarize(_SAMPLE_QUESTION, _SAMPLE_ANSWER * 5)
+
+
+@benchmark("conversation.log_append")
+def bench_log_append():
+    from Smart_Conversation_Manager import SmartConversationManager
+    # 追加会让日志越来越大，每个样本开始前恢复到只有初始内容的日志
+    tmp_dir = tempfile.mkdtemp()
+    work_dir = Path(tmp_dir) / 'log'
+    work_dir.mkdir()
+    manager = SmartConversationManager(work_dir)
+    entry = manager.format_log_entry(_conversation(0))
+    manager.log_writer.append(entry)
+    yield (lambda: manager.log_writer.append(entry)), _restorer(work_dir)
+    shutil.rmtree(tmp_dir)
@@ -0,0 +1,679 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+COVID-19 检测数据分析核心模块
+covid_data_analysis.py 与 analyze_covid_data.py 共用的读取、预处理和汇总计算，
+两个报告脚本只负责输出和绘图
+"""
+
+import csv
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from timer_utils import profiled
+
+try:
+    import pyarrow as pa
+except ImportError:  # 未安装 pyarrow 时不使用列式缓存
+    pa = None
+
+# 参与汇总的原始计数列
+COUNT_COLUMNS = ['Positive', 'Negative']
+
+# 汇总结果中的指标列
+AGG_COLUMNS = ['Positive', 'Negative', 'Total_Tests']
+
+# 多维计数立方体的最大单元数，超过后改为逐维度计数
+MAX_CUBE_CELLS = 20_000_000
+
+# 日期列的固定格式，如 8/16/2020
+DATE_FORMAT = '%m/%d/%Y'
+
+# 列式缓存格式版本，解析方式变化时递增以使旧缓存失效
+CSV_CACHE_VERSION = '1'
+
+# 流式读取时使用的显式列类型，避免逐块推断类型并压缩内存
+STREAM_DTYPES = {
+    'Date': 'object',
+    'Type': 'category',
+    'residence': 'category',
+    'Positive': 'int32',
+    'Negative': 'int32',
+}
+
+# 流式读取的默认块大小（行数）
+STREAM_CHUNKSIZE = 500000
+
+# 流式/增量模式下逐块汇总的维度
+STREAM_KEYS = ['Type', 'residence', 'Month', 'Date']
+
+# 聚合结果持久化文件的格式版本，格式变化时旧文件会被重新计算
+AGG_STORE_VERSION = 2
+
+# 月份排序
+MONTH_ORDER = ['January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November', 'December']
+
+# 报告章节及其对应的汇总维度
+SECTION_KEYS = {
+    'type': 'Type',
+    'residence': 'residence',
+    'month': 'Month',
+    'daily': 'Date',
+    'year_month': 'YearMonth',
+}
+
+# 滚动趋势的默认窗口（天）
+ROLLING_WINDOWS = (7, 14, 28)
+
+# 可以直接由按日汇总结果推导的维度，无需再扫描逐行数据
+DATE_DERIVED_KEYS = {
+    'YearMonth': lambda dates: dates.to_period('M'),
+}
+
+
+def parse_dates(values, date_format=DATE_FORMAT):
+    """
+    按固定格式解析日期列
+
+    日期字符串重复度很高，先去重只解析唯一值，再按因子编码映射回每一行；
+    只有固定格式解析失败的值才退回到自动推断格式。
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques)
+    parsed = pd.to_datetime(uniques, format=date_format, errors='coerce')
+    failed = parsed.isna() & uniques.notna()
+    if failed.any():
+        parsed[failed] = pd.to_datetime(uniques[failed])
+    return pd.Series(parsed.array.take(codes, allow_fill=True), index=values.index, name=values.name)
+
+
+def default_cache_path(file_path):
+    """列式缓存文件的默认路径（与源文件放在一起）"""
+    return f"{file_path}.arrow"
+
+
+def _source_signature(file_path):
+    """源文件签名：修改时间和大小，任一变化即视为缓存失效"""
+    st = os.stat(file_path)
+    return {
+        b'covid_cache.version': CSV_CACHE_VERSION.encode(),
+        b'covid_cache.mtime_ns': str(st.st_mtime_ns).encode(),
+        b'covid_cache.size': str(st.st_size).encode(),
+    }
+
+
+def _read_arrow_cache(cache_path, signature):
+    """以内存映射方式读取列式缓存，签名不符时返回 None"""
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with pa.memory_map(cache_path, 'r') as source:
+            reader = pa.ipc.open_file(source)
+            metadata = reader.schema.metadata or {}
+            if any(metadata.get(k) != v for k, v in signature.items()):
+                return None
+            return reader.read_all().to_pandas()
+    except (OSError, pa.ArrowException):
+        return None
+
+
+def _write_arrow_cache(cache_path, data, signature):
+    """
+    把解析后的数据写成 Arrow IPC 文件，先写临时文件再原子替换
+
+    缓存只是加速手段：列类型无法转换（如同一列混有数字和字符串）或写入失败时
+    只打印提示并删除临时文件，不影响本次读取结果。
+    """
+    tmp_path = f"{cache_path}.tmp"
+    try:
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **signature})
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, cache_path)
+    except (OSError, pa.ArrowException) as e:
+        print(f"写入列式缓存失败（本次不使用缓存）: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def read_csv_cached(file_path, use_cache=True, cache_path=None):
+    """
+    读取 CSV 并把日期列解析为 datetime
+
+    解析后的带类型数据以 Arrow IPC 格式缓存在源文件旁，源文件的修改时间
+    或大小变化时自动重建；之后的读取直接内存映射缓存，不再解析文本和日期。
+    未安装 pyarrow 时退化为普通读取。
+    """
+    use_cache = use_cache and pa is not None
+    if use_cache:
+        cache_path = cache_path or default_cache_path(file_path)
+        signature = _source_signature(file_path)
+        data = _read_arrow_cache(cache_path, signature)
+        if data is not None:
+            return data
+
+    data = pd.read_csv(file_path)
+    if 'Date' in data.columns:
+        data['Date'] = parse_dates(data['Date'])
+
+    if use_cache:
+        _write_arrow_cache(cache_path, data, signature)
+    return data
+
+
+def add_positive_rate(stats, fill_zero=False):
+    """根据汇总结果计算阳性率（百分比）"""
+    stats['Positive_Rate'] = stats['Positive'] / stats['Total_Tests'] * 100
+    if fill_zero:
+        stats['Positive_Rate'] = stats['Positive_Rate'].fillna(0)
+    return stats
+
+
+@profiled
+def aggregate(data, keys, rate=True):
+    """
+    一次扫描同时计算多个维度的汇总结果
+
+    每个维度先做因子化编码，再把所有维度的编码合成一个扁平键，
+    用 np.bincount 一次得到 Positive/Negative 的多维计数立方体，
+    各维度的汇总结果只需在立方体上对其余轴求和。
+    返回 {维度: 以该维度为索引的汇总表}，缺失键与 groupby 一样被丢弃。
+    """
+    keys = list(keys)
+    codes, levels = [], []
+    for key in keys:
+        key_codes, uniques = pd.factorize(data[key], sort=True)
+        # 缺失值单独占用最后一个编码，汇总后再去掉，使各维度互不影响
+        key_codes = np.where(key_codes < 0, len(uniques), key_codes)
+        codes.append(key_codes)
+        levels.append(uniques)
+
+    shape = tuple(len(uniques) + 1 for uniques in levels)
+    counts = {col: data[col].to_numpy(dtype=np.float64) for col in COUNT_COLUMNS}
+
+    sums = {}
+    if int(np.prod(shape, dtype=np.int64)) <= MAX_CUBE_CELLS:
+        flat = np.ravel_multi_index(codes, shape)
+        cubes = {
+            col: np.bincount(flat, weights=values, minlength=int(np.prod(shape))).reshape(shape)
+            for col, values in counts.items()
+        }
+        for axis, key in enumerate(keys):
+            others = tuple(i for i in range(len(keys)) if i != axis)
+            sums[key] = {col: cube.sum(axis=others) for col, cube in cubes.items()}
+    else:
+        for axis, key in enumerate(keys):
+            sums[key] = {
+                col: np.bincount(codes[axis], weights=values, minlength=shape[axis])
+                for col, values in counts.items()
+            }
+
+    result = {}
+    for key, uniques in zip(keys, levels):
+        stats = pd.DataFrame(
+            {col: np.rint(sums[key][col][:len(uniques)]).astype(np.int64) for col in COUNT_COLUMNS},
+            index=pd.Index(uniques, name=key),
+        )
+        stats['Total_Tests'] = stats['Positive'] + stats['Negative']
+        if rate:
+            add_positive_rate(stats)
+        result[key] = stats
+    return result
+
+
+@profiled
+def load_data(file_path, use_cache=True):
+    """读取CSV文件（解析结果缓存为列式文件，重复运行时直接加载）"""
+    try:
+        data = read_csv_cached(file_path, use_cache=use_cache)
+        print(f"成功读取数据，共 {len(data)} 行")
+        return data
+    except Exception as e:
+        print(f"读取文件出错: {e}")
+        return None
+
+
+@profiled
+def preprocess_data(data):
+    """数据预处理"""
+    # 转换日期列（固定格式，按唯一值解析）
+    data['Date'] = parse_dates(data['Date'])
+
+    # 添加月份列以便按月分析（整数编码 1-12，输出时再转换为月份名称）
+    data['Month'] = data['Date'].dt.month.astype('int8')
+
+    # 计算每日总测试数
+    data['Total_Tests'] = data['Positive'] + data['Negative']
+
+    # 计算阳性率
+    data['Positive_Rate'] = data['Positive'] / data['Total_Tests'] * 100
+    data['Positive_Rate'] = data['Positive_Rate'].fillna(0)  # 处理除以0的情况
+
+    return data
+
+
+def summarize(sums, key):
+    """由汇总结果生成带阳性率的统计表"""
+    if key == 'Month':
+        sums = sums.reindex(range(1, 13)).dropna()
+    stats = sums[AGG_COLUMNS].rename_axis(key).reset_index()
+    # 流式和首次增量读取得到分类类型，全量读取得到字符串；统一为字符串，
+    # 相同的数据无论经哪条路径读取都得到相同的统计表（图表缓存键也相同）
+    if isinstance(stats[key].dtype, pd.CategoricalDtype):
+        stats[key] = stats[key].astype(str)
+    if key == 'Month':
+        stats['Month'] = [MONTH_ORDER[month - 1] for month in stats['Month']]
+    return add_positive_rate(stats, fill_zero=(key == 'Date'))
+
+
+def accumulate_chunks(chunks, running=None):
+    """将一批数据块逐块累加到各维度的汇总结果中"""
+    if running is None:
+        running = dict.fromkeys(STREAM_KEYS)
+    rows = 0
+    last_date = None
+    for chunk in chunks:
+        rows += len(chunk)
+        chunk = preprocess_data(chunk)
+        chunk_last = chunk['Date'].max()
+        if last_date is None or chunk_last > last_date:
+            last_date = chunk_last
+        # 每块只扫描一次即得到所有维度的汇总
+        parts = aggregate(chunk, STREAM_KEYS, rate=False)
+        for key, part in parts.items():
+            if running[key] is not None:
+                # 各块的分类取值可能不同，合并后重新按键汇总
+                part = pd.concat([running[key], part]).groupby(level=0).sum()
+            running[key] = part
+    return running, rows, last_date
+
+
+@profiled
+def load_data_streaming(file_path, chunksize=STREAM_CHUNKSIZE):
+    """
+    分块流式读取CSV，每块直接累加到各维度的汇总结果中
+
+    返回 {维度: 汇总表}，峰值内存只与块大小有关，与文件大小无关
+    """
+    try:
+        reader = pd.read_csv(file_path, dtype=STREAM_DTYPES, chunksize=chunksize)
+        running, rows, _ = accumulate_chunks(reader)
+    except Exception as e:
+        print(f"读取文件出错: {e}")
+        return None
+
+    if rows == 0:
+        print("读取文件出错: 文件中没有数据")
+        return None
+
+    print(f"成功流式读取数据，共 {rows} 行")
+    return running
+
+
+class _BoundedReader:
+    """只读取文件中 [start, end) 字节范围的文件对象，供 pandas 读取新增的尾部数据"""
+
+    def __init__(self, f, start, end):
+        self.f = f
+        self.f.seek(start)
+        self.remaining = end - start
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+def default_store_path(file_path):
+    """聚合结果持久化文件的默认路径"""
+    return f"{file_path}.agg.json"
+
+
+def load_store(store_path):
+    """读取持久化的汇总结果，文件不存在或格式不符时返回 None"""
+    if not os.path.exists(store_path):
+        return None
+    try:
+        with open(store_path, 'r', encoding='utf-8') as f:
+            store = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"读取汇总缓存出错，将重新计算: {e}")
+        return None
+    if store.get('version') != AGG_STORE_VERSION:
+        return None
+
+    sums = {}
+    for key in STREAM_KEYS:
+        entry = store['sums'][key]
+        index = pd.Index(entry['index'], name=key)
+        if key == 'Date':
+            index = pd.DatetimeIndex(pd.to_datetime(index), name=key)
+        elif key == 'Month':
+            index = index.astype('int64')
+        sums[key] = pd.DataFrame({col: entry[col] for col in AGG_COLUMNS},
+                                 index=index, dtype='int64')
+    store['sums'] = sums
+    return store
+
+
+def save_store(store_path, store):
+    """保存汇总结果、已读取的字节位置和最后日期"""
+    sums = {}
+    for key, frame in store['sums'].items():
+        index = frame.index
+        if key == 'Date':
+            index = index.strftime('%Y-%m-%d')
+        sums[key] = {'index': [str(x) for x in index]}
+        sums[key].update({col: frame[col].tolist() for col in AGG_COLUMNS})
+
+    payload = dict(store, sums=sums, version=AGG_STORE_VERSION)
+    tmp_path = f"{store_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp_path, store_path)
+
+
+def _line_before(f, offset):
+    """读取 offset 之前的最后一行，用于确认已读取部分未被改写"""
+    start = max(0, offset - 4096)
+    f.seek(start)
+    block = f.read(offset - start)
+    return block.rstrip(b'\r\n').rsplit(b'\n', 1)[-1].decode('utf-8')
+
+
+@profiled
+def load_data_incremental(file_path, chunksize=STREAM_CHUNKSIZE, store_path=None):
+    """
+    增量读取：只处理上次运行之后追加到文件末尾的新数据
+
+    文件只允许在末尾追加；若表头或已读取部分发生变化则重新全量计算
+    """
+    store_path = store_path or default_store_path(file_path)
+    try:
+        with open(file_path, 'rb') as f:
+            header = f.readline()
+            header_end = f.tell()
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+
+            columns = header.decode('utf-8').strip().split(',')
+
+            # 只读取到最后一个完整行；没有换行符的最后一行若列数与表头一致也视为完整
+            # （很多文件末尾没有换行），否则视为尚未写完，留到下次
+            end = size
+            unterminated = False
+            if size > header_end:
+                f.seek(max(header_end, size - 4096))
+                tail = f.read()
+                if not tail.endswith(b'\n'):
+                    last_newline = tail.rfind(b'\n')
+                    line_start = size - len(tail) + last_newline + 1 if last_newline >= 0 else header_end
+                    last_line = tail[last_newline + 1:].decode('utf-8', errors='replace')
+                    if len(next(csv.reader([last_line]))) == len(columns):
+                        unterminated = True
+                    else:
+                        end = line_start
+                        print("最后一行没有换行符且列数与表头不符（可能尚未写完），留到下次读取")
+
+            store = load_store(store_path)
+            if store is not None:
+                if (store['header'] != header.decode('utf-8')
+                        or store['offset'] > end
+                        or _line_before(f, store['offset']) != store['last_line']):
+                    print("源文件已被修改（非追加），重新全量计算")
+                    store = None
+                elif store.get('unterminated') and store['offset'] < size:
+                    # 上次按完整行读取的最后一行没有换行符，之后若不是以换行接着追加，说明该行被续写过
+                    f.seek(store['offset'])
+                    if f.read(1) not in (b'\n', b'\r'):
+                        print("上次读取的最后一行之后被续写，重新全量计算")
+                        store = None
+
+            if store is None:
+                store = {
+                    'header': header.decode('utf-8'),
+                    'offset': header_end,
+                    'rows': 0,
+                    'last_date': None,
+                    'last_line': '',
+                    'sums': None,
+                }
+
+            start = store['offset']
+            new_rows = 0
+            running = store['sums']
+            if end > start:
+                reader = pd.read_csv(_BoundedReader(f, start, end), header=None, names=columns,
+                                     dtype=STREAM_DTYPES, chunksize=chunksize)
+                running, new_rows, last_date = accumulate_chunks(reader, running)
+                if last_date is not None:
+                    last_date = last_date.strftime('%Y-%m-%d')
+                    if store['last_date'] is None or last_date > store['last_date']:
+                        store['last_date'] = last_date
+                store['last_line'] = _line_before(f, end)
+    except Exception as e:
+        print(f"读取文件出错: {e}")
+        return None
+
+    if running is None:
+        print("读取文件出错: 文件中没有数据")
+        return None
+
+    store['sums'] = running
+    store['offset'] = end
+    store['unterminated'] = unterminated
+    store['rows'] += new_rows
+    save_store(store_path, store)
+
+    print(f"增量读取数据：新增 {new_rows} 行，累计 {store['rows']} 行，"
+          f"最后日期 {store['last_date']}")
+    return running
+
+
+def rolling_trends(data, windows=ROLLING_WINDOWS, group=None):
+    """
+    计算多个窗口的滚动阳性数、测试数和加权阳性率
+
+    先用 np.bincount 把数据汇总成 (日历日 × 分组) 的稠密矩阵，缺少数据的日期补 0；
+    再对日期轴做一次累计和，每个窗口的滚动和只是累计和的错位相减，
+    所有分组同时计算，耗时与窗口数量基本无关。
+    data 可以是逐行数据，也可以是已经按日汇总的数据（需要 Date、Positive、Negative 列）。
+    返回长表：Date、分组列（可选）、Positive、Total_Tests，
+    以及每个窗口 w 的 Positive_{w}d、Total_Tests_{w}d、Positive_Rate_{w}d；
+    不足一个完整窗口的日期为缺失值。
+    """
+    dates = data['Date']
+    valid = dates.notna().to_numpy()
+    if group is not None:
+        group_codes, levels = pd.factorize(data[group], sort=True)
+        valid = valid & (group_codes >= 0)
+    else:
+        group_codes, levels = np.zeros(len(data), dtype=np.int64), [None]
+
+    start = dates.min().normalize()
+    days = ((dates[valid] - start) // pd.Timedelta(days=1)).to_numpy(dtype=np.int64)
+    n_days = int(days.max()) + 1 if len(days) else 0
+    n_groups = len(levels)
+
+    flat = days * n_groups + group_codes[valid]
+    size = n_days * n_groups
+    positive = data['Positive'].to_numpy(dtype=np.float64)[valid]
+    negative = data['Negative'].to_numpy(dtype=np.float64)[valid]
+    counts = {
+        'Positive': np.bincount(flat, weights=positive, minlength=size),
+        'Total_Tests': np.bincount(flat, weights=positive + negative, minlength=size),
+    }
+    counts = {col: np.rint(values).astype(np.int64).reshape(n_days, n_groups)
+              for col, values in counts.items()}
+
+    result = {'Date': np.repeat(pd.date_range(start, periods=n_days, freq='D'), n_groups)}
+    if group is not None:
+        result[group] = np.tile(np.asarray(levels, dtype=object), n_days)
+    for col, matrix in counts.items():
+        result[col] = matrix.ravel()
+
+    # 在日期轴上补一行 0 后做累计和，窗口和 = cumsum[t + 1] - cumsum[t + 1 - w]
+    cumsums = {col: np.vstack([np.zeros((1, n_groups), dtype=np.int64), matrix.cumsum(axis=0)])
+               for col, matrix in counts.items()}
+    for w in windows:
+        window_sums = {}
+        for col, cumsum in cumsums.items():
+            window = np.full((n_days, n_groups), np.nan)
+            if n_days >= w:
+                window[w - 1:] = cumsum[w:] - cumsum[:-w]
+            window_sums[col] = window
+            result[f'{col}_{w}d'] = window.ravel()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = window_sums['Positive'] / window_sums['Total_Tests'] * 100
+        rate[~np.isfinite(rate)] = np.nan
+        result[f'Positive_Rate_{w}d'] = rate.ravel()
+    return pd.DataFrame(result)
+
+
+class CovidAnalysis:
+    """
+    COVID-19 检测数据分析流水线
+
+    原始数据、预处理数据和各维度汇总都在第一次需要时计算并缓存在实例上，
+    同一实例上生成的多个报告共享这些中间结果，每项只计算一次。
+    mode 为 'full'（整表读取）、'stream'（分块流式）或 'incremental'（增量）。
+    """
+
+    MODES = ('full', 'stream', 'incremental')
+
+    def __init__(self, file_path, mode='full', chunksize=STREAM_CHUNKSIZE, use_cache=True):
+        if mode not in self.MODES:
+            raise ValueError(f"未知的读取模式: {mode}")
+        self.file_path = file_path
+        self.mode = mode
+        self.chunksize = chunksize
+        self.use_cache = use_cache
+        self.failed = False
+        self._raw = None
+        self._data = None
+        self._sums = {}
+        self._trends = {}
+
+    @property
+    def raw(self):
+        """读取后的逐行数据（仅整表模式），读取失败时为 None"""
+        if self.mode != 'full':
+            raise ValueError("流式和增量模式不保留逐行数据")
+        if self._raw is None and not self.failed:
+            self._raw = load_data(self.file_path, use_cache=self.use_cache)
+            self.failed = self._raw is None
+        return self._raw
+
+    @property
+    def data(self):
+        """预处理后的逐行数据，与 raw 共享原始列"""
+        if self._data is None and self.raw is not None:
+            self._data = preprocess_data(self.raw.copy(deep=False))
+        return self._data
+
+    def rollups(self, keys):
+        """返回 {维度: 汇总表}，尚未计算的维度在一次扫描中一起计算；读取失败时返回 None"""
+        needed = []
+        for key in keys:
+            source = 'Date' if key in DATE_DERIVED_KEYS else key
+            if source not in self._sums and source not in needed:
+                needed.append(source)
+
+        if needed and not self.failed:
+            if self.mode == 'full':
+                if self.data is not None:
+                    self._sums.update(aggregate(self.data, needed, rate=False))
+            else:
+                unsupported = [key for key in needed if key not in STREAM_KEYS]
+                if unsupported:
+                    raise ValueError(f"流式和增量模式不支持的汇总维度: {unsupported}")
+                # 流式和增量模式一次读取即得到所有基础维度
+                if self.mode == 'incremental':
+                    sums = load_data_incremental(self.file_path, self.chunksize)
+                else:
+                    sums = load_data_streaming(self.file_path, self.chunksize)
+                self.failed = sums is None
+                if sums is not None:
+                    self._sums.update(sums)
+        if self.failed:
+            return None
+
+        for key in keys:
+            if key not in self._sums:
+                daily = self._sums['Date']
+                derived = DATE_DERIVED_KEYS[key](daily.index)
+                self._sums[key] = daily.groupby(derived).sum().rename_axis(key)
+        return {key: self._sums[key] for key in keys}
+
+    def run(self, sections):
+        """计算指定报告章节的统计表，返回 {章节: 统计表}；读取失败时返回 None"""
+        unknown = [section for section in sections if section not in SECTION_KEYS]
+        if unknown:
+            raise ValueError(f"未知的报告章节: {unknown}")
+        sums = self.rollups([SECTION_KEYS[section] for section in sections])
+        if sums is None:
+            return None
+        return {section: summarize(sums[SECTION_KEYS[section]], SECTION_KEYS[section])
+                for section in sections}
+
+    def rolling(self, group=None, windows=ROLLING_WINDOWS):
+        """
+        多窗口滚动趋势（见 rolling_trends），结果缓存在实例上
+
+        不分组时直接使用按日汇总结果，所有读取模式都可用；
+        按 Type 或 residence 分组时需要逐行数据，仅整表模式可用。
+        """
+        key = (group, tuple(windows))
+        if key not in self._trends:
+            if group is None:
+                sums = self.rollups(['Date'])
+                source = None if sums is None else sums['Date'].reset_index()
+            else:
+                if self.mode != 'full':
+                    raise ValueError("流式和增量模式只支持不分组的滚动趋势")
+                source = self.data
+            if source is None:
+                return None
+            self._trends[key] = rolling_trends(source, windows, group)
+        return self._trends[key]
+
+
+# 进程内共享的分析流水线实例
+_ANALYSES = {}
+
+
+def open_analysis(file_path, mode='full', chunksize=STREAM_CHUNKSIZE, use_cache=True):
+    """
+    获取共享的分析流水线实例
+
+    同一进程中对同一文件（修改时间和大小未变）的重复调用返回同一实例，
+    依次运行多个报告时直接复用已经计算好的中间结果。
+    """
+    try:
+        st = os.stat(file_path)
+        signature = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        signature = None
+    key = (os.path.abspath(file_path), mode, chunksize, use_cache, signature)
+    if key not in _ANALYSES:
+        _ANALYSES[key] = CovidAnalysis(file_path, mode, chunksize, use_cache)
+    return _ANALYSES[key]
+
+
+def release_analysis(file_path):
+    """释放某个文件的共享分析流水线实例，批量处理多个文件时避免内存持续增长"""
+    path = os.path.abspath(file_path)
+    for key in [key for key in _ANALYSES if key[0] == path]:
+        del _ANALYSES[key]
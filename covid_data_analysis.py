@@ -1,47 +1,39 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from datetime import datetime
+import json
 import os
 
-# 设置中文显示
-plt.rcParams['font.sans-serif'] = ['SimHei']  # 用来正常显示中文标签
-plt.rcParams['axes.unicode_minus'] = False  # 用来正常显示负号
+from covid_core import ROLLING_WINDOWS, STREAM_CHUNKSIZE, aggregate, open_analysis, summarize
+# 读取和预处理已移到 covid_core，这里重新导出，保持 from covid_data_analysis import load_data 等用法可用
+from covid_core import load_data, preprocess_data  # noqa: F401
+from timer_utils import profiled, profiler, span
 
-# 读取CSV文件
-def load_data(file_path):
-    try:
-        data = pd.read_csv(file_path)
-        print(f"成功读取数据，共 {len(data)} 行")
-        return data
-    except Exception as e:
-        print(f"读取文件出错: {e}")
-        return None
+# 绘图库在第一次绘制图表时由 load_plotting() 导入（pyplot 和 seaborn 的导入约占启动时间的一半），
+# --help、只输出统计和图表缓存全部命中时都不需要
+plt = None
+sns = None
 
-# 数据预处理
-def preprocess_data(data):
-    # 转换日期列
-    data['Date'] = pd.to_datetime(data['Date'])
-    
-    # 添加月份列以便按月分析
-    data['Month'] = data['Date'].dt.month_name()
-    
-    # 计算每日总测试数
-    data['Total_Tests'] = data['Positive'] + data['Negative']
-    
-    # 计算阳性率
-    data['Positive_Rate'] = data['Positive'] / data['Total_Tests'] * 100
-    data['Positive_Rate'] = data['Positive_Rate'].fillna(0)  # 处理除以0的情况
-    
-    return data
+# 图表字体设置
+CHART_FONT = ['SimHei']  # 用来正常显示中文标签
+CHART_UNICODE_MINUS = False  # 用来正常显示负号
 
-# 基本统计分析
-def basic_statistics(data):
+# 导入绘图库并设置中文显示
+def load_plotting():
+    global plt, sns
+    if plt is None:
+        import matplotlib.pyplot as pyplot
+        import seaborn
+        
+        pyplot.rcParams['font.sans-serif'] = CHART_FONT
+        pyplot.rcParams['axes.unicode_minus'] = CHART_UNICODE_MINUS
+        plt, sns = pyplot, seaborn
+
+# 打印基本统计信息
+def print_statistics(type_stats, residence_stats, month_stats):
     print("\n=== 基本统计信息 ===")
     
     # 总阳性、阴性和测试数
-    total_positive = data['Positive'].sum()
-    total_negative = data['Negative'].sum()
+    total_positive = type_stats['Positive'].sum()
+    total_negative = type_stats['Negative'].sum()
     total_tests = total_positive + total_negative
     
     print(f"总测试数: {total_tests}")
@@ -49,57 +41,60 @@ def basic_statistics(data):
     print(f"总阴性数: {total_negative}")
     print(f"总体阳性率: {total_positive / total_tests * 100:.2f}%")
     
-    # 按人员类型统计
     print("\n=== 按人员类型统计 ===")
-    type_stats = data.groupby('Type').agg({
-        'Positive': 'sum',
-        'Negative': 'sum',
-        'Total_Tests': 'sum'
-    }).reset_index()
-    type_stats['Positive_Rate'] = type_stats['Positive'] / type_stats['Total_Tests'] * 100
     print(type_stats)
     
-    # 按居住类型统计
     print("\n=== 按居住类型统计 ===")
-    residence_stats = data.groupby('residence').agg({
-        'Positive': 'sum',
-        'Negative': 'sum',
-        'Total_Tests': 'sum'
-    }).reset_index()
-    residence_stats['Positive_Rate'] = residence_stats['Positive'] / residence_stats['Total_Tests'] * 100
     print(residence_stats)
     
-    # 按月统计
     print("\n=== 按月统计 ===")
-    month_order = ['January', 'February', 'March', 'April', 'May', 'June', 
-                  'July', 'August', 'September', 'October', 'November', 'December']
-    month_stats = data.groupby('Month').agg({
-        'Positive': 'sum',
-        'Negative': 'sum',
-        'Total_Tests': 'sum'
-    }).reindex(month_order).reset_index().dropna()
-    month_stats['Positive_Rate'] = month_stats['Positive'] / month_stats['Total_Tests'] * 100
     print(month_stats)
+
+# 打印最近一天的多窗口滚动阳性率（窗口阳性数 / 窗口测试数的加权阳性率）
+def print_rolling_trends(analysis, groups=(None, 'Type', 'residence')):
+    print("\n=== 滚动阳性率趋势（最近一天） ===")
+    columns = [f'Positive_Rate_{w}d' for w in ROLLING_WINDOWS]
+    for group in groups:
+        trends = analysis.rolling(group)
+        if trends is None:
+            return
+        latest = trends[trends['Date'] == trends['Date'].max()]
+        print(latest[[group or 'Date'] + columns].to_string(index=False))
+
+# 基本统计分析
+@profiled
+def basic_statistics(data):
+    sums = aggregate(data, ['Type', 'residence', 'Month'], rate=False)
+    type_stats = summarize(sums['Type'], 'Type')
+    residence_stats = summarize(sums['residence'], 'residence')
+    month_stats = summarize(sums['Month'], 'Month')
+    
+    print_statistics(type_stats, residence_stats, month_stats)
     
     return type_stats, residence_stats, month_stats
 
-# 数据可视化
-def visualize_data(data, type_stats, residence_stats, month_stats):
-    # 创建图表保存目录
-    if not os.path.exists('charts'):
-        os.makedirs('charts')
-    
-    # 1. 按人员类型的阳性和阴性对比
+# 图表保存目录
+CHART_DIR = 'charts'
+
+# 图表分辨率
+CHART_DPI = 300
+
+# 图表缓存清单，记录每个图表文件对应的内容键
+CHART_CACHE_FILE = '.chart_cache.json'
+
+# 1. 按人员类型的阳性和阴性对比
+def plot_type_comparison(type_stats, path):
     plt.figure(figsize=(12, 6))
     type_stats_melt = type_stats.melt(id_vars=['Type'], value_vars=['Positive', 'Negative'], 
                                      var_name='Result', value_name='Count')
     sns.barplot(x='Type', y='Count', hue='Result', data=type_stats_melt)
     plt.title('不同人员类型的COVID-19测试结果')
     plt.ylabel('数量')
-    plt.savefig('charts/type_comparison.png', dpi=300, bbox_inches='tight')
+    plt.savefig(path, dpi=CHART_DPI, bbox_inches='tight')
     plt.close()
-    
-    # 2. 按居住类型的阳性和阴性对比
+
+# 2. 按居住类型的阳性和阴性对比
+def plot_residence_comparison(residence_stats, path):
     plt.figure(figsize=(12, 6))
     residence_stats_melt = residence_stats.melt(id_vars=['residence'], value_vars=['Positive', 'Negative'], 
                                                var_name='Result', value_name='Count')
@@ -108,10 +103,11 @@ def visualize_data(data, type_stats, residence_stats, month_stats):
     plt.ylabel('数量')
     plt.xticks(rotation=45, ha='right')
     plt.tight_layout()
-    plt.savefig('charts/residence_comparison.png', dpi=300, bbox_inches='tight')
+    plt.savefig(path, dpi=CHART_DPI, bbox_inches='tight')
     plt.close()
-    
-    # 3. 按月的阳性和阴性趋势
+
+# 3. 按月的阳性和阴性趋势
+def plot_monthly_trend(month_stats, path):
     plt.figure(figsize=(14, 8))
     plt.plot(month_stats['Month'], month_stats['Positive'], marker='o', label='阳性')
     plt.plot(month_stats['Month'], month_stats['Negative'], marker='s', label='阴性')
@@ -121,10 +117,11 @@ def visualize_data(data, type_stats, residence_stats, month_stats):
     plt.legend()
     plt.grid(True, alpha=0.3)
     plt.tight_layout()
-    plt.savefig('charts/monthly_trend.png', dpi=300, bbox_inches='tight')
+    plt.savefig(path, dpi=CHART_DPI, bbox_inches='tight')
     plt.close()
-    
-    # 4. 阳性率对比（按人员类型和居住类型）
+
+# 4. 阳性率对比（按人员类型和居住类型）
+def plot_positive_rate_comparison(type_stats, residence_stats, path):
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
     
     sns.barplot(x='Type', y='Positive_Rate', data=type_stats, ax=ax1)
@@ -138,54 +135,155 @@ def visualize_data(data, type_stats, residence_stats, month_stats):
     ax2.set_xticklabels(ax2.get_xticklabels(), ha='right')
     
     plt.tight_layout()
-    plt.savefig('charts/positive_rate_comparison.png', dpi=300, bbox_inches='tight')
+    plt.savefig(path, dpi=CHART_DPI, bbox_inches='tight')
     plt.close()
-    
-    # 5. 总体阳性率趋势
-    # 先按日期聚合数据
-    daily_data = data.groupby('Date').agg({
-        'Positive': 'sum',
-        'Negative': 'sum',
-        'Total_Tests': 'sum'
-    }).reset_index()
-    daily_data['Positive_Rate'] = daily_data['Positive'] / daily_data['Total_Tests'] * 100
-    daily_data['Positive_Rate'] = daily_data['Positive_Rate'].fillna(0)
-    
+
+# 5. 总体阳性率趋势
+def plot_positive_rate_trend(daily_data, path):
     # 计算7天移动平均
-    daily_data['7-Day Avg Positive Rate'] = daily_data['Positive_Rate'].rolling(window=7).mean()
+    rolling_rate = daily_data['Positive_Rate'].rolling(window=7).mean()
     
     plt.figure(figsize=(14, 8))
     plt.plot(daily_data['Date'], daily_data['Positive_Rate'], alpha=0.3, label='每日阳性率')
-    plt.plot(daily_data['Date'], daily_data['7-Day Avg Positive Rate'], color='red', label='7天移动平均阳性率')
+    plt.plot(daily_data['Date'], rolling_rate, color='red', label='7天移动平均阳性率')
     plt.title('COVID-19阳性率趋势')
     plt.xlabel('日期')
     plt.ylabel('阳性率 (%)')
     plt.legend()
     plt.grid(True, alpha=0.3)
     plt.tight_layout()
-    plt.savefig('charts/positive_rate_trend.png', dpi=300, bbox_inches='tight')
+    plt.savefig(path, dpi=CHART_DPI, bbox_inches='tight')
     plt.close()
+
+# 图表任务列表：(绘图函数, 汇总数据, 输出路径)，只包含体积很小的汇总表
+def chart_specs(type_stats, residence_stats, month_stats, daily_data):
+    return [
+        (plot_type_comparison, (type_stats,), os.path.join(CHART_DIR, 'type_comparison.png')),
+        (plot_residence_comparison, (residence_stats,), os.path.join(CHART_DIR, 'residence_comparison.png')),
+        (plot_monthly_trend, (month_stats,), os.path.join(CHART_DIR, 'monthly_trend.png')),
+        (plot_positive_rate_comparison, (type_stats, residence_stats),
+         os.path.join(CHART_DIR, 'positive_rate_comparison.png')),
+        (plot_positive_rate_trend, (daily_data,), os.path.join(CHART_DIR, 'positive_rate_trend.png')),
+    ]
+
+# 绘制单个图表（也是子进程中的任务入口）
+def render_chart(spec):
+    plot, frames, path = spec
+    load_plotting()
+    with span(plot.__name__):
+        plot(*frames, path)
+    return path
+
+# 计算图表的内容键：汇总数据 + 绘图参数（分辨率、字体） + 绘图代码及库版本
+# 键不变说明图表内容不会变化，可以直接复用已有文件
+def chart_key(spec):
+    import hashlib
+    import inspect
+    from importlib.metadata import version
+    
+    plot, frames, path = spec
+    h = hashlib.sha256()
+    for frame in frames:
+        h.update(repr(list(zip(frame.columns, frame.dtypes.astype(str)))).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    # 库版本从安装信息读取，不必为了计算缓存键导入 matplotlib 和 seaborn
+    params = {
+        'dpi': CHART_DPI,
+        'font.sans-serif': list(CHART_FONT),
+        'axes.unicode_minus': CHART_UNICODE_MINUS,
+        'matplotlib': version('matplotlib'),
+        'seaborn': version('seaborn'),
+    }
+    h.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+    # 绘图函数源码中包含 figsize 等参数，修改代码会使缓存失效
+    h.update(inspect.getsource(plot).encode('utf-8'))
+    return h.hexdigest()
+
+# 读取图表缓存清单
+def load_chart_cache():
+    cache_path = os.path.join(CHART_DIR, CHART_CACHE_FILE)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# 保存图表缓存清单
+def save_chart_cache(cache):
+    cache_path = os.path.join(CHART_DIR, CHART_CACHE_FILE)
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+# 子进程初始化：使用非交互的 Agg 后端，字体设置与主进程一致
+def _init_render_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+    load_plotting()
+
+# 数据可视化
+# workers 大于 1 时用进程池并行绘制各图表，输出文件与串行绘制完全一致
+# use_cache 为 True 时跳过内容键未变化且文件仍存在的图表
+@profiled
+def visualize_data(data, type_stats, residence_stats, month_stats, daily_data=None, workers=1,
+                   use_cache=True):
+    # 创建图表保存目录
+    if not os.path.exists(CHART_DIR):
+        os.makedirs(CHART_DIR)
+    
+    # 先按日期聚合数据（流式模式下由调用方传入）
+    if daily_data is None:
+        daily_data = summarize(aggregate(data, ['Date'], rate=False)['Date'], 'Date')
+    
+    specs = chart_specs(type_stats, residence_stats, month_stats, daily_data)
+    
+    cache = load_chart_cache() if use_cache else {}
+    keys = {spec[2]: chart_key(spec) for spec in specs}
+    total = len(specs)
+    specs = [spec for spec in specs
+             if cache.get(os.path.basename(spec[2])) != keys[spec[2]] or not os.path.exists(spec[2])]
+    if use_cache:
+        print(f"\n图表缓存: 命中 {total - len(specs)} 个，未命中 {len(specs)} 个")
+    
+    if workers and workers > 1 and len(specs) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        
+        with ProcessPoolExecutor(max_workers=min(workers, len(specs)),
+                                 initializer=_init_render_worker) as pool:
+            list(pool.map(render_chart, specs))
+    else:
+        for spec in specs:
+            render_chart(spec)
+    
+    for path, key in keys.items():
+        cache[os.path.basename(path)] = key
+    save_chart_cache(cache)
     
     print("\n图表已保存到 charts 文件夹中")
 
 # 主函数
-def main():
-    # 文件路径
-    file_path = 'UM_C19_2021.csv'
+@profiled
+def main(stream=False, chunksize=STREAM_CHUNKSIZE, incremental=False, workers=1, use_cache=True,
+         file_path='UM_C19_2021.csv', trends=False):
+    # 读取模式：增量模式在上次保存的汇总结果上只累加新追加的数据，
+    # 流式模式分块读取并直接得到各维度汇总结果
+    mode = 'incremental' if incremental else 'stream' if stream else 'full'
+    analysis = open_analysis(file_path, mode=mode, chunksize=chunksize)
     
-    # 读取数据
-    data = load_data(file_path)
-    if data is None:
+    # 一次扫描得到统计和图表需要的所有维度
+    stats = analysis.run(['type', 'residence', 'month', 'daily'])
+    if stats is None:
         return
     
-    # 数据预处理
-    data = preprocess_data(data)
-    
     # 基本统计分析
-    type_stats, residence_stats, month_stats = basic_statistics(data)
+    print_statistics(stats['type'], stats['residence'], stats['month'])
+    
+    # 滚动趋势（流式和增量模式下只有按日汇总，不分组）
+    if trends:
+        print_rolling_trends(analysis, groups=(None, 'Type', 'residence') if mode == 'full' else (None,))
     
     # 数据可视化
-    visualize_data(data, type_stats, residence_stats, month_stats)
+    visualize_data(None, stats['type'], stats['residence'], stats['month'],
+                   daily_data=stats['daily'], workers=workers, use_cache=use_cache)
     
     # 输出数据洞察
     print("\n=== 数据洞察 ===")
@@ -195,4 +293,23 @@ def main():
     print("4. 所有分析图表已保存到charts文件夹，可供进一步查看和使用")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='COVID-19 检测数据分析')
+    parser.add_argument('--stream', action='store_true', help='分块流式读取，适用于超大文件')
+    parser.add_argument('--chunksize', type=int, default=STREAM_CHUNKSIZE, help='流式读取的块大小（行数）')
+    parser.add_argument('--incremental', action='store_true', help='增量模式：只处理上次运行后新追加的数据')
+    parser.add_argument('--jobs', type=int, default=1, help='并行绘制图表的进程数')
+    parser.add_argument('--no-chart-cache', action='store_true', help='忽略图表缓存，重新绘制所有图表')
+    parser.add_argument('--trends', action='store_true', help='输出 7/14/28 天滚动阳性率（总体、按人员类型和居住类型）')
+    parser.add_argument('--profile-out', help='输出各阶段耗时统计并保存到该文件（*.trace.json 为 Chrome trace 格式，其余为 JSON）')
+    args = parser.parse_args()
+    
+    main(stream=args.stream, chunksize=args.chunksize, incremental=args.incremental,
+         workers=args.jobs, use_cache=not args.no_chart_cache, trends=args.trends)
+    
+    if args.profile_out:
+        print("\n=== 各阶段耗时 ===")
+        profiler.report()
+        profiler.export(args.profile_out)
+        print(f"耗时统计已保存为 '{args.profile_out}'")
\ No newline at end of file
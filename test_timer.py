@@ -1,17 +1,19 @@
 # 测试Code Runner运行时间显示的Python脚本
-import time
+# 单次计时受噪声影响很大，这里用 benchmark.py 的统计测量：预热后重复运行，直到置信区间足够窄
+# 完整的基准测试套件（COVID 汇总、统计函数、对话保存和读取）: python benchmark.py
+from benchmark import measure, format_time
 
-# 简单的循环操作
-start_time = time.time()
 
-# 执行一些操作
-result = 0
-for i in range(1000000):
-    result += i
+# 简单的循环操作
+def loop(n=1000000):
+    result = 0
+    for i in range(n):
+        result += i
+    return result
 
-end_time = time.time()
 
-print(f"计算结果: {result}")
-print(f"代码执行时间: {end_time - start_time:.6f} 秒")
+print(f"计算结果: {loop()}")
 
-# 手动添加的计时信息，这样即使Code Runner的时间显示不工作，您也能看到运行时间
\ No newline at end of file
+stats = measure(loop, max_time=3.0)
+print(f"代码执行时间: 中位数 {format_time(stats['median'])}，四分位距 {format_time(stats['iqr'])}，"
+      f"{stats['ops_per_sec']:.1f} 次/秒（{stats['runs']} 个样本，置信区间 ±{stats['rel_ci'] * 100:.1f}%）")
@@ -1,43 +1,351 @@
+import os
+import json
 import time
+import random
+import weakref
+import threading
+from collections import deque
 from functools import wraps
 
+# 每个标签保留的耗时样本数（蓄水池抽样），用于估计分位数，内存占用固定
+SAMPLE_SIZE = 1024
+
+# Chrome trace 最多保留的最近事件数
+MAX_TRACE_EVENTS = 100000
+
+
+# 已排序数据的分位数（线性插值），q 取 0-100
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q / 100
+    lower = int(pos)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (pos - lower)
+
+
+class _Stat:
+    """一个调用路径的累计统计"""
+    __slots__ = ('count', 'total_ns', 'child_ns', 'min_ns', 'max_ns', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.child_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+        self.samples = []
+
+    def add(self, elapsed, child_ns, random):
+        self.count += 1
+        self.total_ns += elapsed
+        self.child_ns += child_ns
+        if self.min_ns is None or elapsed < self.min_ns:
+            self.min_ns = elapsed
+        if elapsed > self.max_ns:
+            self.max_ns = elapsed
+        if len(self.samples) < SAMPLE_SIZE:
+            self.samples.append(elapsed)
+        else:
+            i = int(random() * self.count)
+            if i < SAMPLE_SIZE:
+                self.samples[i] = elapsed
+
+    def merge(self, other, random):
+        """把另一个统计并入本统计；两个蓄水池按各自代表的次数加权抽样合并"""
+        count = self.count + other.count
+        if len(self.samples) + len(other.samples) <= SAMPLE_SIZE:
+            samples = self.samples + other.samples
+        else:
+            samples = []
+            mine, theirs = list(self.samples), list(other.samples)
+            while len(samples) < SAMPLE_SIZE and (mine or theirs):
+                source = mine if not theirs or (mine and random() * count < self.count) else theirs
+                samples.append(source.pop(int(random() * len(source))))
+        self.count = count
+        self.total_ns += other.total_ns
+        self.child_ns += other.child_ns
+        if other.min_ns is not None and (self.min_ns is None or other.min_ns < self.min_ns):
+            self.min_ns = other.min_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+        self.samples = samples
+
+
+class _Span:
+    """一次计时区间，进入时压入当前线程的调用栈，退出时把耗时记到父区间和统计中"""
+    __slots__ = ('profiler', 'label', 'path', 'tid', 'start_ns', 'elapsed_ns', 'child_ns')
+
+    def __init__(self, profiler, label):
+        self.profiler = profiler
+        self.label = label
+        self.elapsed_ns = 0
+
+    def __enter__(self):
+        stack, self.tid, _ = self.profiler._thread_state()
+        self.path = stack[-1].path + (self.label,) if stack else (self.label,)
+        stack.append(self)
+        self.child_ns = 0
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        end_ns = time.perf_counter_ns()
+        self.elapsed_ns = end_ns - self.start_ns
+        stack, _, stats = self.profiler._thread_state()
+        stack.pop()
+        if stack:
+            stack[-1].child_ns += self.elapsed_ns
+        self.profiler._record(self, stats)
+        return False
+
+    @property
+    def elapsed(self):
+        """耗时（秒）"""
+        return self.elapsed_ns / 1e9
+
+
+class _NullSpan:
+    """性能分析器关闭时使用的空区间"""
+    elapsed_ns = 0
+    elapsed = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _ThreadMarker:
+    """保存在线程局部存储中，线程结束时随之释放，用于触发统计表的合并"""
+    __slots__ = ('__weakref__',)
+
+
+# 方法4：分层性能分析器 - 可以常开的低开销埋点
+class Profiler:
+    """
+    分层性能分析器
+
+    span() 区间可以任意嵌套，每个线程各有一个调用栈；统计按调用路径（如 main/load_data）聚合，
+    记录次数、总耗时、自身耗时（去掉子区间）、最小/最大值和分位数。
+    分位数来自固定大小的蓄水池样本，最近的事件保存在有界队列中，内存占用不随调用次数增长。
+    环境变量 TIMER_PROFILE=0 时关闭，span() 只返回一个空对象。
+    """
+
+    def __init__(self, enabled=True, trace=True):
+        self.enabled = enabled
+        self.trace = trace
+        self._local = threading.local()
+        # 可重入：线程局部存储释放时的终结器可能在持有锁的线程中运行
+        self._lock = threading.RLock()
+        self._random = random.Random(0).random
+        # 存活线程的统计表（以表的 id 为键），报告时合并；
+        # 线程结束后其统计表并入 _dead_stats 并从这里移除，内存不随创建过的线程数增长
+        self._thread_stats = {}
+        self._dead_stats = {}
+        self.reset()
+
+    def reset(self):
+        """清空所有统计和事件"""
+        with self._lock:
+            for stats in self._thread_stats.values():
+                stats.clear()
+            self._dead_stats = {}
+            self._events = deque(maxlen=MAX_TRACE_EVENTS)
+            self._epoch_ns = time.perf_counter_ns()
+
+    def _thread_state(self):
+        """当前线程的 (调用栈, 线程 id, 统计表)；每个线程写自己的统计表，记录时不需要加锁"""
+        try:
+            return self._local.state
+        except AttributeError:
+            stats = {}
+            with self._lock:
+                self._thread_stats[id(stats)] = stats
+            self._local.state = ([], threading.get_ident(), stats)
+            # 线程结束时线程局部存储被释放，标记对象的终结器把统计表并入 _dead_stats
+            self._local.marker = _ThreadMarker()
+            weakref.finalize(self._local.marker, self._retire, stats).atexit = False
+            return self._local.state
+
+    def _retire(self, stats):
+        """把已结束线程的统计表并入共享的汇总表"""
+        with self._lock:
+            if self._thread_stats.pop(id(stats), None) is None:
+                return
+            for path, stat in stats.items():
+                dead = self._dead_stats.get(path)
+                if dead is None:
+                    self._dead_stats[path] = stat
+                else:
+                    dead.merge(stat, self._random)
+
+    def _record(self, span, stats):
+        stat = stats.get(span.path)
+        if stat is None:
+            stat = stats[span.path] = _Stat()
+        stat.add(span.elapsed_ns, span.child_ns, self._random)
+        if self.trace:
+            self._events.append((span.label, span.path, span.start_ns, span.elapsed_ns, span.tid))
+
+    def span(self, label):
+        """计时区间（上下文管理器），嵌套使用时记录父子关系"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, label)
+
+    def profiled(self, label=None):
+        """函数计时装饰器，默认以函数的限定名作为标签；可以直接 @profiled 或 @profiled("标签")"""
+        if callable(label):
+            return self.profiled()(label)
+
+        def decorator(func):
+            name = label or func.__qualname__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Span(self, name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def stats(self):
+        """按调用路径返回统计结果列表（时间单位为毫秒），父路径在子路径之前，同级按总耗时降序"""
+        # 合并各线程的统计表
+        merged = {}
+        with self._lock:
+            for stats in [*self._thread_stats.values(), self._dead_stats]:
+                for path, stat in list(stats.items()):
+                    item = merged.setdefault(path, [path, 0, 0, 0, None, 0, []])
+                    item[1] += stat.count
+                    item[2] += stat.total_ns
+                    item[3] += stat.child_ns
+                    item[4] = stat.min_ns if item[4] is None else min(item[4], stat.min_ns)
+                    item[5] = max(item[5], stat.max_ns)
+                    item[6] += stat.samples
+        items = [(*item[:6], sorted(item[6])) for item in merged.values()]
+
+        totals = {item[0]: item[2] for item in items}
+        # 按路径上每一级的总耗时排序，得到深度优先的树形顺序
+        def order(item):
+            path = item[0]
+            return [(-totals.get(path[:i + 1], 0), path[i]) for i in range(len(path))]
+
+        result = []
+        for path, count, total_ns, child_ns, min_ns, max_ns, samples in sorted(items, key=order):
+            result.append({
+                "path": "/".join(path),
+                "label": path[-1],
+                "depth": len(path) - 1,
+                "count": count,
+                "total_ms": total_ns / 1e6,
+                "self_ms": (total_ns - child_ns) / 1e6,
+                "mean_ms": total_ns / count / 1e6,
+                "min_ms": min_ns / 1e6,
+                "max_ms": max_ns / 1e6,
+                "p50_ms": percentile(samples, 50) / 1e6,
+                "p90_ms": percentile(samples, 90) / 1e6,
+                "p99_ms": percentile(samples, 99) / 1e6,
+            })
+        return result
+
+    def report(self, file=None):
+        """打印树形统计表"""
+        rows = self.stats()
+        if not rows:
+            print("（没有性能分析记录）", file=file)
+            return
+        print(f"{'label':<40} {'count':>8} {'total_ms':>12} {'self_ms':>12} {'mean_ms':>10} "
+              f"{'p50_ms':>10} {'p90_ms':>10} {'p99_ms':>10}", file=file)
+        for row in rows:
+            name = '  ' * row["depth"] + row["label"]
+            print(f"{name:<40} {row['count']:>8} {row['total_ms']:>12.3f} {row['self_ms']:>12.3f} "
+                  f"{row['mean_ms']:>10.3f} {row['p50_ms']:>10.3f} {row['p90_ms']:>10.3f} "
+                  f"{row['p99_ms']:>10.3f}", file=file)
+
+    def export_json(self, file_path):
+        """把统计结果写成 JSON"""
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump({"pid": os.getpid(), "stats": self.stats()}, f, ensure_ascii=False, indent=2)
+
+    def export_chrome_trace(self, file_path):
+        """把最近的区间事件写成 Chrome trace 格式，可在 chrome://tracing 或 Perfetto 中打开"""
+        with self._lock:
+            events = list(self._events)
+            epoch_ns = self._epoch_ns
+        pid = os.getpid()
+        trace = [{
+            "name": label,
+            "cat": "timer",
+            "ph": "X",
+            "ts": (start_ns - epoch_ns) / 1000,
+            "dur": elapsed_ns / 1000,
+            "pid": pid,
+            "tid": tid,
+            "args": {"path": "/".join(path)},
+        } for label, path, start_ns, elapsed_ns, tid in events]
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+    def export(self, file_path):
+        """按文件名选择导出格式：*.trace.json 为 Chrome trace，其余为统计 JSON"""
+        if str(file_path).endswith('.trace.json'):
+            self.export_chrome_trace(file_path)
+        else:
+            self.export_json(file_path)
+
+
+# 进程内共享的性能分析器
+profiler = Profiler(enabled=os.environ.get('TIMER_PROFILE', '1') != '0')
+span = profiler.span
+profiled = profiler.profiled
+
+
 # 方法1：装饰器形式 - 用于计时整个函数
 def timer(func):
-    """函数执行时间计时装饰器"""
+    """函数执行时间计时装饰器（同时记录到 profiler）"""
     @wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
-        result = func(*args, **kwargs)
-        end_time = time.time()
-        print(f"函数 '{func.__name__}' 执行时间: {end_time - start_time:.6f} 秒")
-        return result
+        with Timer(f"函数 '{func.__name__}'"):
+            return func(*args, **kwargs)
     return wrapper
 
 # 方法2：上下文管理器形式 - 用于计时代码块
 class Timer:
-    """代码块执行时间计时上下文管理器"""
-    def __init__(self, description="代码块"):
+    """代码块执行时间计时上下文管理器（同时记录到 profiler）"""
+    def __init__(self, description="代码块", quiet=False):
         self.description = description
+        self.quiet = quiet
         self.start_time = None
         self.end_time = None
+        self.elapsed = None
         
     def __enter__(self):
-        self.start_time = time.time()
+        self._span = profiler.span(self.description).__enter__()
+        self.start_time = time.perf_counter()
         return self
         
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.end_time = time.time()
-        print(f"{self.description} 执行时间: {self.end_time - self.start_time:.6f} 秒")
+        self.end_time = time.perf_counter()
+        self._span.__exit__(exc_type, exc_val, exc_tb)
+        self.elapsed = self.end_time - self.start_time
+        if not self.quiet:
+            print(f"{self.description} 执行时间: {self.elapsed:.6f} 秒")
         
 # 方法3：简单的函数形式 - 手动计时
 def start_timer():
     """开始计时"""
-    return time.time()
+    return time.perf_counter()
 
 
 def stop_timer(start_time, description="代码"):
     """结束计时并显示结果"""
-    end_time = time.time()
+    end_time = time.perf_counter()
     print(f"{description} 执行时间: {end_time - start_time:.6f} 秒")
     return end_time - start_time
 
@@ -66,4 +374,14 @@ if __name__ == "__main__":
     result = 0
     for i in range(1000000):
         result += i
-    stop_timer(start, "手动计时循环")
\ No newline at end of file
+    stop_timer(start, "手动计时循环")
+    
+    # 示例4：嵌套区间和统计报告
+    @profiled
+    def inner(n):
+        return sum(range(n))
+    
+    with span("外层"):
+        for _ in range(100):
+            inner(10000)
+    profiler.report()
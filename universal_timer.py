@@ -1,13 +1,64 @@
 import time
 import sys
 import os
+import re
+import json
+import runpy
+import signal
+import threading
+import argparse
+import platform
+import statistics
+import subprocess
+import unicodedata
+from collections import Counter
 
-def run_with_time(file_path):
+try:
+    import resource
+except ImportError:  # Windows 上没有 resource 模块，子进程模式只统计墙钟时间
+    resource = None
+
+# 子进程资源统计的字段：(rusage 字段, 输出名称, 说明)
+RUSAGE_FIELDS = [
+    ('ru_utime', 'user_time', '用户态 CPU 时间 (秒)'),
+    ('ru_stime', 'system_time', '内核态 CPU 时间 (秒)'),
+    ('ru_maxrss', 'max_rss_kb', '峰值常驻内存 (KB)'),
+    ('ru_minflt', 'minor_faults', '次缺页'),
+    ('ru_majflt', 'major_faults', '主缺页'),
+    ('ru_nvcsw', 'voluntary_switches', '自愿上下文切换'),
+    ('ru_nivcsw', 'involuntary_switches', '非自愿上下文切换'),
+    ('ru_inblock', 'block_input', '块设备读入次数'),
+    ('ru_oublock', 'block_output', '块设备写出次数'),
+]
+
+USAGE_EPILOG = """说明:
+1. 此脚本可以在任何目录下运行Python文件并显示运行时间
+2. 复制此脚本到您需要的任何目录，然后在命令行中执行上述命令
+3. 您也可以将脚本所在目录添加到系统PATH中，以便在任何位置直接使用
+4. --subprocess 在独立的子进程中运行，额外统计 CPU 时间、峰值内存、缺页、上下文切换和块 I/O；
+   -n 指定重复运行次数并输出汇总统计，--json 输出机器可读的结果
+5. --profile 在采样分析器下运行，输出自身耗时最多的函数，并保存折叠栈和 speedscope 文件
+6. --importtime 分析启动耗时：按包汇总每个模块的导入耗时（如 python universal_timer.py --importtime 脚本.py --help）
+"""
+
+# 采样分析器的默认采样间隔（秒）
+DEFAULT_INTERVAL = 0.001
+
+def run_script(file_path):
+    """以 __main__ 身份执行 Python 文件；目标脚本调用 sys.exit() 时只显示退出码，不中断计时"""
+    try:
+        runpy.run_path(file_path, run_name="__main__")
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            print(f"脚本退出码: {e.code}")
+
+def run_with_time(file_path, args=()):
     """运行指定的Python文件并显示运行时间"""
     try:
         # 记录开始时间
         start_time = time.time()
         start_time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_time))
+        start = time.perf_counter()
         
         print(f"=== 开始运行: {file_path} ({start_time_str}) ===")
         
@@ -16,11 +67,10 @@ def run_with_time(file_path):
         
         try:
             # 设置新的sys.argv，第一个参数为文件路径
-            sys.argv = [file_path] + sys.argv[2:]
+            sys.argv = [file_path] + list(args)
             
-            # 执行指定的Python文件
-            with open(file_path, 'r', encoding='utf-8') as f:
-                exec(f.read())
+            # 在独立的命名空间中以 __main__ 身份执行指定的Python文件，不污染计时脚本的全局变量
+            run_script(file_path)
         finally:
             # 恢复原始的sys.argv
             sys.argv = original_argv
@@ -30,7 +80,7 @@ def run_with_time(file_path):
         end_time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(end_time))
         
         # 计算运行时间
-        execution_time = end_time - start_time
+        execution_time = time.perf_counter() - start
         
         print(f"=== 运行结束: {file_path} ({end_time_str}) ===")
         print(f"=== 运行时间: {execution_time:.6f} 秒 ({execution_time*1000:.2f} 毫秒) ===")
@@ -40,19 +90,426 @@ def run_with_time(file_path):
     except Exception as e:
         print(f"运行时错误: {str(e)}")
 
-def main():
-    if len(sys.argv) < 2:
-        print("用法: python universal_timer.py your_file.py [additional_args]")
-        print("
-说明:
-1. 此脚本可以在任何目录下运行Python文件并显示运行时间
-2. 复制此脚本到您需要的任何目录，然后在命令行中执行上述命令
-3. 您也可以将脚本所在目录添加到系统PATH中，以便在任何位置直接使用
-        ")
+def run_subprocess(command, quiet=False, stdout=None):
+    """
+    在子进程中运行命令，返回一次运行的统计
+
+    POSIX 上用 os.wait4 回收子进程，得到只属于该子进程的 rusage；
+    其他平台只有墙钟时间和退出码。
+    quiet 为 True 时丢弃子进程的输出，否则子进程的标准输出写到 stdout（默认继承）。
+    """
+    start = time.perf_counter()
+    if quiet:
+        proc = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    else:
+        proc = subprocess.Popen(command, stdout=stdout)
+    usage = None
+    if resource is not None and hasattr(os, 'wait4'):
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall_time = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    else:
+        proc.wait()
+        wall_time = time.perf_counter() - start
+
+    run = {"wall_time": wall_time, "exit_code": proc.returncode}
+    if usage is not None:
+        for field, name, _ in RUSAGE_FIELDS:
+            run[name] = getattr(usage, field)
+        # macOS 的 ru_maxrss 单位是字节，Linux 是 KB
+        if sys.platform == 'darwin':
+            run['max_rss_kb'] //= 1024
+        run['cpu_time'] = run['user_time'] + run['system_time']
+    return run
+
+def summarize_runs(runs):
+    """多次运行的汇总统计：每个数值指标的最小值、中位数、均值、标准差和最大值"""
+    summary = {}
+    for name in runs[0]:
+        if name == 'exit_code':
+            continue
+        values = [run[name] for run in runs]
+        summary[name] = {
+            "min": min(values),
+            "median": statistics.median(values),
+            "mean": statistics.fmean(values),
+            "stdev": statistics.stdev(values) if len(values) > 1 else 0.0,
+            "max": max(values),
+        }
+    return summary
+
+def _ljust(text, width):
+    """按显示宽度左对齐（中文字符占两列）"""
+    display = sum(2 if unicodedata.east_asian_width(ch) in 'WF' else 1 for ch in text)
+    return text + ' ' * max(0, width - display)
+
+def print_runs(command, runs, summary):
+    """以表格形式输出子进程运行的统计"""
+    labels = [('wall_time', '墙钟时间 (秒)'), ('cpu_time', 'CPU 时间 (秒)')]
+    labels += [(name, label) for _, name, label in RUSAGE_FIELDS]
+    print(f"\n=== 子进程运行统计: {' '.join(command)} ({len(runs)} 次) ===")
+    failed = [run['exit_code'] for run in runs if run['exit_code'] != 0]
+    if failed:
+        print(f"⚠️ {len(failed)} 次运行退出码非 0: {failed}")
+    print(_ljust('指标', 26) + ''.join(f"{key:>16}" for key in ("min", "median", "mean", "stdev", "max")))
+    for name, label in labels:
+        if name not in summary:
+            continue
+        stats = summary[name]
+        fmt = '.6f' if isinstance(runs[0][name], float) else ',.0f'
+        print(_ljust(label, 26) + ''.join(f"{stats[key]:>16{fmt}}" for key in ("min", "median", "mean", "stdev", "max")))
+
+def run_measured(file_path, args=(), repeat=1, quiet=False, json_path=None):
+    """在子进程中运行 Python 文件 repeat 次，输出统计，可选写入 JSON（'-' 表示标准输出）"""
+    if not os.path.exists(file_path):
+        print(f"错误: 找不到文件 '{file_path}'")
+        return 1
+    command = [sys.executable, file_path] + list(args)
+    # JSON 输出到标准输出时，进度和脚本自身的输出改写到标准错误
+    log = sys.stderr if json_path == '-' else sys.stdout
+    runs = []
+    for i in range(repeat):
+        if repeat > 1 and not quiet:
+            print(f"=== 第 {i + 1}/{repeat} 次运行 ===", file=log)
+        runs.append(run_subprocess(command, quiet=quiet, stdout=log if json_path == '-' else None))
+    summary = summarize_runs(runs)
+
+    result = {
+        "command": command,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "runs": runs,
+        "summary": summary,
+    }
+    if json_path == '-':
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_runs(command, runs, summary)
+        if json_path:
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            print(f"结果已保存为 '{json_path}'")
+    return 1 if any(run['exit_code'] != 0 for run in runs) else 0
+
+class StackSampler:
+    """
+    统计采样分析器
+
+    signal 模式用 SIGPROF 定时器按进程 CPU 时间采样主线程（仅 POSIX）；
+    thread 模式由后台线程按墙钟时间读取所有线程的调用栈（sys._current_frames，各平台可用）。
+    每个样本按距上次采样实际经过的时间加权：长时间运行的 C 扩展调用（如 pandas）期间
+    Python 层无法采样，它的耗时会记到调用它的 Python 函数上，而不会被少算。
+    调用栈只保留被分析脚本的部分，计时工具和 runpy 的栈帧被去掉。
+    """
+
+    def __init__(self, mode='signal', interval=DEFAULT_INTERVAL):
+        self.mode = mode
+        self.interval = interval
+        # 调用栈（代码对象元组，从外到内） -> 累计秒数
+        self.weights = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._busy = False
+        # runpy 执行脚本模块代码的函数，调用栈在它之下的部分属于计时工具
+        self._boundary = runpy._run_code.__code__
+        self._main_thread = threading.main_thread().ident
+
+    def _stack(self, frame, ident):
+        """从栈顶到脚本入口的调用栈（从外到内）；主线程尚未进入脚本时返回 None"""
+        stack = []
+        while frame is not None:
+            if frame.f_code is self._boundary:
+                return tuple(reversed(stack))
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        return None if ident == self._main_thread else tuple(reversed(stack))
+
+    def _add(self, stack, weight):
+        if stack:
+            self.weights[stack] += weight
+
+    def _on_signal(self, signum, frame):
+        # 处理函数本身被下一个信号打断时直接返回，这段时间计入下一个样本
+        if self._busy:
+            return
+        self._busy = True
+        now = time.process_time()
+        self._add(self._stack(frame, self._main_thread), now - self._last)
+        self.samples += 1
+        self._last = now
+        self._busy = False
+
+    def _run_thread(self):
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self._add(self._stack(frame, ident), now - last)
+            self.samples += 1
+            last = now
+
+    def start(self):
+        if self.mode == 'signal':
+            self._last = time.process_time()
+            self._previous = signal.signal(signal.SIGPROF, self._on_signal)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            self._thread = threading.Thread(target=self._run_thread, name='stack-sampler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self.mode == 'signal':
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, self._previous)
+        else:
+            self._stop.set()
+            self._thread.join()
+
+def _frame_name(code):
+    """栈帧显示名：函数名 (文件名:起始行)；折叠栈格式中分号是分隔符，需要去掉"""
+    name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return name.replace(';', ',')
+
+def write_collapsed(weights, file_path):
+    """写出折叠栈格式（flamegraph.pl / speedscope 均可读取），每行为 外层;...;内层 微秒数"""
+    with open(file_path, 'w', encoding='utf-8') as f:
+        for stack, weight in sorted(weights.items(), key=lambda item: -item[1]):
+            if stack and weight > 0:
+                f.write(';'.join(_frame_name(code) for code in stack) + f" {round(weight * 1e6)}\n")
+
+def write_speedscope(weights, file_path, name):
+    """写出 speedscope 的 sampled 格式（https://www.speedscope.app）"""
+    frames, index = [], {}
+    samples, sample_weights = [], []
+    for stack, weight in weights.items():
+        if not stack or weight <= 0:
+            continue
+        for code in stack:
+            if code not in index:
+                index[code] = len(frames)
+                frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        samples.append([index[code] for code in stack])
+        sample_weights.append(weight)
+    profile = {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(sample_weights),
+            "samples": samples,
+            "weights": sample_weights,
+        }],
+        "name": name,
+        "activeProfileIndex": 0,
+        "exporter": "universal_timer.py",
+    }
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f)
+
+def print_top_functions(weights, top=20):
+    """输出自身耗时（栈顶）最多的函数，以及包含子调用的总耗时"""
+    total = sum(weights.values())
+    if total <= 0:
+        print("没有采样到被分析脚本的调用栈（运行时间太短？可以减小 --interval）")
         return
+    self_time, inclusive = Counter(), Counter()
+    for stack, weight in weights.items():
+        if not stack:
+            continue
+        self_time[stack[-1]] += weight
+        for code in set(stack):
+            inclusive[code] += weight
+    print(f"\n=== 自身耗时最多的 {top} 个函数（共 {total:.3f} 秒） ===")
+    print(f"{'self(s)':>10} {'self%':>7} {'total(s)':>10} {'total%':>7}  函数")
+    for code, weight in self_time.most_common(top):
+        print(f"{weight:>10.3f} {weight / total * 100:>6.1f}% {inclusive[code]:>10.3f} "
+              f"{inclusive[code] / total * 100:>6.1f}%  {_frame_name(code)}")
+
+def run_profiled(file_path, args=(), sampler='signal', interval=DEFAULT_INTERVAL, output=None, top=20):
+    """
+    在分析器下运行 Python 文件（与默认模式一样在当前进程中执行）
+
+    sampler 为 signal / thread 时使用采样分析器，输出自身耗时排行，
+    并保存 <output>.collapsed.txt（折叠栈）和 <output>.speedscope.json；
+    为 cprofile 时使用确定性的 cProfile，按自身耗时输出排行并保存 <output>.pstats。
+    脚本启动的子进程（如进程池）不在分析范围内。
+    """
+    if not os.path.exists(file_path):
+        print(f"错误: 找不到文件 '{file_path}'")
+        return 1
+    if sampler == 'signal' and not hasattr(signal, 'setitimer'):
+        print("当前平台不支持 SIGPROF 定时器，改用线程采样")
+        sampler = 'thread'
+    output = output or os.path.splitext(os.path.basename(file_path))[0] + '.profile'
+
+    original_argv = sys.argv
+    sys.argv = [file_path] + list(args)
+    start = time.perf_counter()
+    try:
+        if sampler == 'cprofile':
+            import cProfile
+            import pstats
+            
+            profiler = cProfile.Profile()
+            profiler.runcall(run_script, file_path)
+        else:
+            profiler = StackSampler(sampler, interval)
+            profiler.start()
+            try:
+                run_script(file_path)
+            finally:
+                profiler.stop()
+    finally:
+        sys.argv = original_argv
+    elapsed = time.perf_counter() - start
+    print(f"\n=== 运行时间: {elapsed:.6f} 秒 ===")
+
+    if sampler == 'cprofile':
+        profiler.dump_stats(output + '.pstats')
+        print(f"\n=== 自身耗时最多的 {top} 个函数（cProfile） ===")
+        pstats.Stats(profiler).sort_stats('tottime').print_stats(top)
+        print(f"分析结果已保存为 '{output}.pstats'")
+    else:
+        print(f"采样 {profiler.samples} 次（{sampler}，间隔 {interval * 1000:g} 毫秒）")
+        print_top_functions(profiler.weights, top)
+        write_collapsed(profiler.weights, output + '.collapsed.txt')
+        write_speedscope(profiler.weights, output + '.speedscope.json', os.path.basename(file_path))
+        print(f"\n折叠栈已保存为 '{output}.collapsed.txt'，speedscope 文件已保存为 '{output}.speedscope.json'")
+    return 0
+
+# -X importtime 输出的一行：自身耗时 | 累计耗时 | 缩进表示嵌套层级的模块名（单位微秒）
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S.*)$')
+
+def parse_importtime(lines):
+    """解析 -X importtime 的输出，返回 [{"module", "self_us", "cumulative_us", "depth"}]，顺序与输出一致"""
+    imports = []
+    for line in lines:
+        m = IMPORTTIME_LINE.match(line)
+        if m:
+            imports.append({
+                "module": m.group(4).strip(),
+                "self_us": int(m.group(1)),
+                "cumulative_us": int(m.group(2)),
+                "depth": (len(m.group(3)) - 1) // 2,
+            })
+    return imports
+
+def summarize_imports(imports):
+    """按顶层包汇总自身耗时，并找出最慢的顶层导入（含其子模块）和自身耗时最多的模块"""
+    packages = Counter()
+    counts = Counter()
+    for item in imports:
+        package = item["module"].split('.')[0]
+        packages[package] += item["self_us"]
+        counts[package] += 1
+    return {
+        "total_us": sum(item["self_us"] for item in imports),
+        "modules": len(imports),
+        "packages": [{"package": name, "self_us": us, "modules": counts[name]}
+                     for name, us in packages.most_common()],
+        "top_level": sorted((item for item in imports if item["depth"] == 0),
+                            key=lambda item: -item["cumulative_us"]),
+        "slowest_modules": sorted(imports, key=lambda item: -item["self_us"]),
+    }
+
+def print_imports(summary, top=20):
+    total = summary["total_us"] or 1
+    print(f"\n=== 导入耗时: 共 {summary['modules']} 个模块，{summary['total_us'] / 1e6:.3f} 秒 ===")
+    print(f"\n按顶层包汇总（前 {top} 个）:")
+    print(f"{'self(ms)':>10} {'%':>6} {'modules':>8}  包")
+    for item in summary["packages"][:top]:
+        print(f"{item['self_us'] / 1000:>10.1f} {item['self_us'] / total * 100:>5.1f}% {item['modules']:>8}  {item['package']}")
+    print(f"\n最慢的顶层导入（含子模块，前 {top} 个）:")
+    print(f"{'total(ms)':>10} {'%':>6}  模块")
+    for item in summary["top_level"][:top]:
+        print(f"{item['cumulative_us'] / 1000:>10.1f} {item['cumulative_us'] / total * 100:>5.1f}%  {item['module']}")
+    print(f"\n自身耗时最多的模块（前 {top} 个）:")
+    print(f"{'self(ms)':>10} {'%':>6}  模块")
+    for item in summary["slowest_modules"][:top]:
+        print(f"{item['self_us'] / 1000:>10.1f} {item['self_us'] / total * 100:>5.1f}%  {item['module']}")
+
+def run_importtime(file_path, args=(), top=20, quiet=False, json_path=None):
+    """
+    启动耗时分析：在子进程中以 -X importtime 运行脚本，汇总每个模块的导入耗时
+
+    与直接查看 -X importtime 的原始输出相比，这里按包汇总并排序；
+    脚本自身写到标准错误的内容照常输出。
+    """
+    if not os.path.exists(file_path):
+        print(f"错误: 找不到文件 '{file_path}'")
+        return 1
+    command = [sys.executable, '-X', 'importtime', file_path] + list(args)
+    start = time.perf_counter()
+    proc = subprocess.run(command, stdout=subprocess.DEVNULL if quiet else None, stderr=subprocess.PIPE,
+                          encoding='utf-8', errors='replace')
+    wall_time = time.perf_counter() - start
+
+    lines = proc.stderr.splitlines()
+    if not quiet:
+        for line in lines:
+            if not line.startswith('import time:'):
+                print(line, file=sys.stderr)
+    summary = summarize_imports(parse_importtime(lines))
+
+    if json_path:
+        result = {"command": command, "wall_time": wall_time, "exit_code": proc.returncode, **summary}
+        if json_path == '-':
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+            return proc.returncode and 1
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    print_imports(summary, top)
+    print(f"\n运行时间: {wall_time:.3f} 秒，其中导入 {summary['total_us'] / 1e6:.3f} 秒"
+          f"（{summary['total_us'] / 1e6 / wall_time * 100:.0f}%）")
+    if json_path:
+        print(f"结果已保存为 '{json_path}'")
+    return proc.returncode and 1
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='运行Python文件并显示运行时间',
+        usage='python universal_timer.py [选项] your_file.py [additional_args]',
+        epilog=USAGE_EPILOG, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subprocess', action='store_true',
+                        help='在子进程中运行，统计 CPU 时间、峰值内存、缺页、上下文切换和块 I/O')
+    parser.add_argument('-n', '--repeat', type=int, default=1, help='重复运行次数（使用子进程模式）')
+    parser.add_argument('--json', metavar='FILE', help="把结果写成 JSON（'-' 输出到标准输出；使用子进程模式，也可与 --importtime 一起使用）")
+    parser.add_argument('-q', '--quiet', action='store_true', help='不显示脚本自身的输出（使用子进程模式）')
+    parser.add_argument('--profile', action='store_true', help='在采样分析器下运行，输出热点函数、折叠栈和 speedscope 文件')
+    parser.add_argument('--sampler', choices=['signal', 'thread', 'cprofile'], default='signal',
+                        help='分析方式：signal（SIGPROF 按 CPU 时间采样，仅 POSIX）、thread（线程按墙钟时间采样）、cprofile（确定性分析）')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL * 1000, help='采样间隔（毫秒，默认 1）')
+    parser.add_argument('--profile-out', metavar='PREFIX', help='分析结果文件名前缀（默认为 <脚本名>.profile）')
+    parser.add_argument('--importtime', action='store_true', help='分析启动耗时：汇总并排序每个模块的导入耗时（-X importtime）')
+    parser.add_argument('--top', type=int, default=20, help='输出耗时最多的函数或模块个数')
+    parser.add_argument('file', help='要运行的 Python 文件')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='传给该文件的参数')
+
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        parser.print_help()
+        return 0
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        return run_profiled(args.file, args.args, sampler=args.sampler, interval=args.interval / 1000,
+                            output=args.profile_out, top=args.top)
+    
+    if args.importtime:
+        return run_importtime(args.file, args.args, top=args.top, quiet=args.quiet, json_path=args.json)
     
-    file_path = sys.argv[1]
-    run_with_time(file_path)
+    if args.subprocess or args.repeat > 1 or args.json or args.quiet:
+        return run_measured(args.file, args.args, repeat=max(1, args.repeat), quiet=args.quiet,
+                            json_path=args.json)
+
+    run_with_time(args.file, args.args)
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())